@@ -1,11 +1,16 @@
 """CLI entry point for cc-flow."""
 
+import os
 import tempfile
 import webbrowser
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import typer
 
+if TYPE_CHECKING:
+    from .models import Session
+
 APP_HELP = """
 Visualize Claude Code session transcripts.
 
@@ -44,6 +49,23 @@ Examples:
 
 app = typer.Typer(add_completion=False, help=APP_HELP)
 
+CACHE_HELP = "Reuse the parse of an unchanged session (stored under ~/.cache/cc-flow)"
+
+
+def _cache_dir() -> Path:
+    """Directory for parsed-session snapshots, honouring XDG_CACHE_HOME."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "cc-flow"
+
+
+def _parse(jsonl_path: Path, cache: bool) -> "Session":
+    """Parse a JSONL session, through the snapshot cache when enabled."""
+    from .parser import parse_session, parse_session_cached
+
+    if cache:
+        return parse_session_cached(jsonl_path, _cache_dir())
+    return parse_session(jsonl_path)
+
 
 @app.command(help=HTML_HELP)
 def html(
@@ -53,28 +75,26 @@ def html(
     embed_images: bool = typer.Option(
         False, "--embed-images", help="Embed images as base64 (increases file size)"
     ),
+    cache: bool = typer.Option(False, "--cache", help=CACHE_HELP),
 ) -> None:
-    import json
+    import msgspec
 
-    from .parser import parse_session
-    from .renderer import dict_to_session, render
+    from .renderer import dict_to_session, render_to_file
 
     if not input_path.exists():
         typer.echo(f"Error: File not found: {input_path}", err=True)
         raise typer.Exit(1)
 
     if input_path.suffix == ".json":
-        data = json.loads(input_path.read_text())
+        data = msgspec.json.decode(input_path.read_bytes())
         session = dict_to_session(data)
     else:
-        session = parse_session(input_path)
-
-    html_content = render(session, embed_images=embed_images)
+        session = _parse(input_path, cache)
 
     if output is None:
         output = Path(tempfile.mktemp(suffix=".html", prefix="cc-flow-"))
 
-    output.write_text(html_content)
+    render_to_file(session, output, embed_images=embed_images)
     typer.echo(f"Written to {output}")
 
     if not no_open:
@@ -133,6 +153,9 @@ Output structure:
     "segments": [...],    # Conversation segments (split at compaction boundaries)
     "subagents": {...}    # Subagent transcripts keyed by agent ID
   }
+
+Block fields that are unset (null, or false for is_truncated) are omitted.
+Non-ASCII text is written as UTF-8 rather than \\u escapes.
 """
 
 
@@ -141,21 +164,21 @@ def transcript(
     jsonl_path: Path = typer.Argument(..., help="Path to JSONL transcript file"),
     output: Path | None = typer.Option(None, "-o", "--output", help="Output JSON file path"),
     compact: bool = typer.Option(False, "--compact", help="No indentation (for piping)"),
+    cache: bool = typer.Option(False, "--cache", help=CACHE_HELP),
 ) -> None:
-    from .parser import parse_session
     from .renderer import render_json
 
     if not jsonl_path.exists():
         typer.echo(f"Error: File not found: {jsonl_path}", err=True)
         raise typer.Exit(1)
 
-    session = parse_session(jsonl_path)
+    session = _parse(jsonl_path, cache)
     json_str = render_json(session, jsonl_path, compact=compact)
 
     if output is None:
         typer.echo(json_str)
     else:
-        output.write_text(json_str)
+        output.write_text(json_str, encoding="utf-8")
         typer.echo(f"Written to {output}", err=True)
 
 
@@ -2,7 +2,7 @@
 
 from enum import Enum
 
-from pydantic import BaseModel
+import msgspec
 
 
 class BlockType(str, Enum):
@@ -14,8 +14,13 @@ class BlockType(str, Enum):
     TOOL_RESULT = "tool_result"
 
 
-class Block(BaseModel):
-    """A content block in an assistant response."""
+class Block(msgspec.Struct, omit_defaults=True, gc=False):
+    """A content block in an assistant response.
+
+    Unset optional fields are left out of the JSON output; readers treat a
+    missing key the same as null/false. Blocks hold only scalars, so they are
+    kept out of the cyclic garbage collector.
+    """
 
     type: BlockType
     content: str
@@ -29,7 +34,7 @@ class Block(BaseModel):
     is_truncated: bool = False
 
 
-class Turn(BaseModel):
+class Turn(msgspec.Struct):
     """A user message + assistant response cycle."""
 
     id: int  # Local to segment, starts at 0
@@ -43,14 +48,14 @@ class Turn(BaseModel):
     image_paths: list[str] = []  # Paths to attached images
 
 
-class CompactMetadata(BaseModel):
+class CompactMetadata(msgspec.Struct, gc=False):
     """Metadata about a compaction event."""
 
     trigger: str
     pre_tokens: int
 
 
-class Segment(BaseModel):
+class Segment(msgspec.Struct):
     """A continuous thread of conversation."""
 
     id: int
@@ -60,7 +65,7 @@ class Segment(BaseModel):
     compact_metadata: CompactMetadata | None = None
 
 
-class Session(BaseModel):
+class Session(msgspec.Struct):
     """The entire JSONL file representing one conversation."""
 
     segments: list[Segment]
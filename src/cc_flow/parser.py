@@ -1,35 +1,122 @@
 """JSONL parser for Claude Code transcripts."""
 
-import json
+import contextlib
+import copy
+import hashlib
+import importlib.metadata
+import mmap
+import multiprocessing
+import os
 import re
 import sys
-from collections import defaultdict
+from collections import defaultdict, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter
 from pathlib import Path
+from typing import NamedTuple
+
+import msgspec
 
 from .models import Block, BlockType, CompactMetadata, Segment, Session, Turn
 
+_AGENT_ID_RE = re.compile(r"agentId:\s*([a-f0-9]+)")
+
+# Subagent file count above which load_subagents uses a process pool
+_PARALLEL_SUBAGENT_THRESHOLD = 2
+
+# Files at least this large are memory-mapped rather than read in one go
+_MMAP_THRESHOLD = 256 * 1024
+
+# One decoder shared by every line, instead of msgspec.json.decode setting
+# up its decoding state per call
+_RECORD_DECODER = msgspec.json.Decoder()
+
+_SKIPPED_RECORD_TYPES = frozenset({"file-history-snapshot", "progress"})
+
+# Text of the placeholder records written for pasted images
+_IMAGE_SOURCE_PREFIX = "[Image: source:"
+_IMAGE_SOURCE_PREFIX_LEN = len(_IMAGE_SOURCE_PREFIX)
+
+# Prefixes of user messages that were injected by the system, not typed
+_SYSTEM_PREFIXES = (
+    "This session is being continued",
+    "<local-command",
+    "<command-name>",
+    "<command-message>",
+    "<system-reminder>",
+    "[Request interrupted",
+    _IMAGE_SOURCE_PREFIX,
+)
+
+
+def _intern(value):
+    """Intern str values (record/block types, tool names); pass anything else through."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _decode_lines(buf: bytes | mmap.mmap) -> Iterator[dict]:
+    """Decode each newline-terminated JSON record in buf, skipping filtered types."""
+    decode = _RECORD_DECODER.decode
+    size = len(buf)
+    start = 0
+    newlines = counted_upto = 0
+    while start < size:
+        nl = buf.find(b"\n", start)
+        if nl == -1:
+            nl = size
+        line = buf[start:nl]
+        line_start, start = start, nl + 1
+        if not line.strip():
+            continue
+        try:
+            rec = decode(line)
+        except msgspec.DecodeError as e:
+            # Line numbers are only needed here, so count newlines
+            # lazily, resuming from the previous error
+            newlines += buf[counted_upto:line_start].count(b"\n")
+            counted_upto = line_start
+            line_num = newlines + 1
+            print(f"Warning: Skipping malformed JSON at line {line_num}: {e}", file=sys.stderr)
+            continue
+        rec_type = rec.get("type")
+        if rec_type in _SKIPPED_RECORD_TYPES:
+            continue
+        # Type strings repeat across every record; intern them so
+        # records share one copy and comparisons hit the identity check
+        if "type" in rec:
+            rec["type"] = _intern(rec_type)
+        if "subtype" in rec:
+            rec["subtype"] = _intern(rec["subtype"])
+        yield rec
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Stream JSONL records, skipping file-history-snapshot and progress records."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _MMAP_THRESHOLD:
+            # Setting up a mapping costs more than one read for small files
+            yield from _decode_lines(f.read())
+            return
+        # Scan the mapped bytes for newlines and hand each slice straight to
+        # msgspec; the page cache backs the buffer instead of a heap copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _decode_lines(mm)
+
 
 def load_records(path: Path) -> list[dict]:
     """Load JSONL, skip file-history-snapshot and progress records."""
-    records = []
-    with open(path) as f:
-        for line_num, line in enumerate(f, 1):
-            if not line.strip():
-                continue
-            try:
-                rec = json.loads(line)
-                if rec.get("type") not in ["file-history-snapshot", "progress"]:
-                    records.append(rec)
-            except json.JSONDecodeError as e:
-                print(f"Warning: Skipping malformed JSON at line {line_num}: {e}", file=sys.stderr)
-    return records
+    return list(iter_records(path))
 
 
-def partition_by_subagent(records: list[dict]) -> tuple[list[dict], dict[str, list[dict]]]:
+def partition_by_subagent(
+    records: Iterable[dict],
+) -> tuple[list[dict], dict[str, list[dict]]]:
     """Partition records into main session and subagent groups.
 
     Args:
-        records: All records from JSONL
+        records: All records from JSONL (any iterable, e.g. iter_records())
 
     Returns:
         Tuple of (main_session_records, {subagent_id: records})
@@ -55,53 +142,118 @@ def get_content_blocks(message: dict) -> list[dict]:
     return content
 
 
+def record_blocks(rec: dict) -> list[dict]:
+    """Content blocks of a record, extracted on first use and cached on the record."""
+    blocks = rec.get("_blocks")
+    if blocks is None:
+        blocks = rec["_blocks"] = get_content_blocks(rec.get("message", {}))
+    return blocks
+
+
 def truncate(text: str, max_len: int = 300) -> str:
     """Truncate text with ellipsis."""
-    text = str(text)
+    # Content is nearly always a str already; skip the str() dispatch for it
+    if type(text) is not str:
+        text = str(text)
     if len(text) > max_len:
         return text[:max_len] + "..."
     return text
 
 
+def _truncate_fields(text: str, max_len: int) -> tuple[str, str | None, bool]:
+    """Return (content, full_content, is_truncated) for a block, checking length once."""
+    if type(text) is not str:
+        text = str(text)
+    if len(text) > max_len:
+        return text[:max_len] + "...", text, True
+    return text, None, False
+
+
 def extract_agent_id_from_result(content: list | str) -> str | None:
     """Extract agentId from tool result content."""
     if isinstance(content, list):
         for item in content:
             if isinstance(item, dict):
                 text = item.get("text", "")
-                match = re.search(r"agentId:\s*([a-f0-9]+)", text)
+                # Most tool results never mention an agent; skip the regex for them
+                if "agentId:" not in text:
+                    continue
+                match = _AGENT_ID_RE.search(text)
                 if match:
                     return match.group(1)
     return None
 
 
-def build_tree(records: list[dict]) -> tuple[dict[str, dict], dict[str, list[str]]]:
-    """Build uuid -> record lookup and children map."""
-    by_uuid = {r.get("uuid"): r for r in records if r.get("uuid")}
-    children_map: dict[str, list[str]] = defaultdict(list)
+class RecordIndex(NamedTuple):
+    """Lookup structures over a session's records, built by index_records."""
 
-    for rec in records:
-        parent = rec.get("parentUuid")
-        uuid = rec.get("uuid")
-        if parent and uuid:
-            children_map[parent].append(uuid)
+    by_uuid: dict[str, dict]
+    children_map: dict[str, list[str]]
+    roots: list[str]
+    # uuids classified once up front so traversals don't re-inspect blocks
+    user_texts: set[str]
+    image_placeholders: set[str]
+    # uuid -> [Image: source:] paths, for user records that have any
+    image_sources: dict[str, list[str]]
 
-    # Sort children by timestamp
-    for _parent, kids in children_map.items():
-        kids.sort(key=lambda u: by_uuid.get(u, {}).get("timestamp", ""))
 
-    return by_uuid, children_map
+def index_records(records: Iterable[dict]) -> RecordIndex:
+    """Build uuid -> record lookup, children map, roots and record kinds in one pass.
 
+    A record is a root when it has no parent, or its parent is not in the
+    dataset. Parents can appear after their children in the file, so any
+    record whose parent hasn't been seen yet is kept as a candidate and the
+    candidates are re-checked once indexing is complete.
+    """
+    by_uuid: dict[str, dict] = {}
+    children_map: dict[str, list[str]] = {}
+    ts_by_uuid: dict[str, str] = {}
+    root_candidates: list[tuple[str, str | None]] = []
+    user_texts: set[str] = set()
+    image_placeholders: set[str] = set()
+    image_sources: dict[str, list[str]] = {}
 
-def find_roots(records: list[dict], by_uuid: dict[str, dict]) -> list[str]:
-    """Find records with no parent in dataset."""
-    roots = []
     for rec in records:
         uuid = rec.get("uuid")
+        if not uuid:
+            continue
+        by_uuid[uuid] = rec
+        ts_by_uuid[uuid] = rec.get("timestamp", "")
+        # Extract content blocks once; the traversal predicates read them repeatedly
+        blocks = get_content_blocks(rec.get("message", {}))
+        for block in blocks:
+            if "type" in block:
+                block["type"] = _intern(block["type"])
+        rec["_blocks"] = blocks
+        # A later record with the same uuid replaces the earlier one
+        user_texts.discard(uuid)
+        image_placeholders.discard(uuid)
+        image_sources.pop(uuid, None)
+        if rec.get("type") == "user":
+            sources = image_source_paths(blocks)
+            if sources:
+                image_sources[uuid] = sources
+        if is_image_placeholder(rec):
+            image_placeholders.add(uuid)
+        elif rec.get("type") == "user" and blocks and blocks[0].get("type") != "tool_result":
+            # Same as is_user_text(), minus the placeholder check done above
+            user_texts.add(uuid)
         parent = rec.get("parentUuid")
-        if uuid and (not parent or parent not in by_uuid):
-            roots.append(uuid)
-    return roots
+        if parent:
+            kids = children_map.get(parent)
+            if kids is None:
+                kids = children_map[parent] = []
+            kids.append(uuid)
+        if not parent or parent not in by_uuid:
+            root_candidates.append((uuid, parent))
+
+    roots = [uuid for uuid, parent in root_candidates if not parent or parent not in by_uuid]
+
+    # Sort children by timestamp
+    for _parent, kids in children_map.items():
+        kids.sort(key=ts_by_uuid.__getitem__)
+
+    return RecordIndex(by_uuid, children_map, roots, user_texts, image_placeholders, image_sources)
 
 
 def is_image_placeholder(rec: dict) -> bool:
@@ -113,7 +265,7 @@ def is_image_placeholder(rec: dict) -> bool:
     """
     if rec.get("type") != "user":
         return False
-    blocks = get_content_blocks(rec.get("message", {}))
+    blocks = record_blocks(rec)
     if not blocks:
         return False
 
@@ -121,31 +273,31 @@ def is_image_placeholder(rec: dict) -> bool:
     first_block = blocks[0]
     if first_block.get("type") == "text":
         text = first_block.get("text", "")
-        if text.startswith("[Image: source:"):
+        if text.startswith(_IMAGE_SOURCE_PREFIX):
             return True
 
-    # Pattern 2: Image-only record (no meaningful text)
-    has_meaningful_text = False
+    # Pattern 2: Image-only record (no meaningful text). Any meaningful text
+    # rules it out, which for ordinary messages is already the first block.
     has_images = False
     for b in blocks:
-        if b.get("type") == "image":
+        btype = b.get("type")
+        if btype == "image":
             has_images = True
-        elif b.get("type") == "text":
-            text = b.get("text", "").strip()
-            if text and not text.startswith("[Image: source:"):
-                has_meaningful_text = True
+        elif btype == "text":
+            text = b.get("text", "")
+            # isspace/lstrip rather than strip(): a long message usually ends
+            # in a newline, and strip() would copy all of it just to test it
+            if text and not text.isspace() and not text.lstrip().startswith(_IMAGE_SOURCE_PREFIX):
+                return False
 
-    if has_images and not has_meaningful_text:
-        return True
-
-    return False
+    return has_images
 
 
 def is_user_text(rec: dict) -> bool:
     """Check if record is user message (not tool_result or image placeholder)."""
     if rec.get("type") != "user":
         return False
-    blocks = get_content_blocks(rec.get("message", {}))
+    blocks = record_blocks(rec)
     if not blocks:
         return False
     first_block = blocks[0]
@@ -160,19 +312,7 @@ def is_user_text(rec: dict) -> bool:
 
 def is_system_message(text: str) -> bool:
     """Check if a user message is actually a system-injected message by content."""
-    system_prefixes = [
-        "This session is being continued",
-        "<local-command",
-        "<command-name>",
-        "<command-message>",
-        "<system-reminder>",
-        "[Request interrupted",
-        "[Image: source:",
-    ]
-    for prefix in system_prefixes:
-        if text.startswith(prefix):
-            return True
-    return False
+    return text.startswith(_SYSTEM_PREFIXES)
 
 
 def is_system_record(rec: dict) -> bool:
@@ -181,31 +321,45 @@ def is_system_record(rec: dict) -> bool:
     if rec.get("isCompactSummary") or rec.get("isVisibleInTranscriptOnly"):
         return True
     # Fall back to content-based detection
-    blocks = get_content_blocks(rec.get("message", {}))
+    blocks = record_blocks(rec)
     if blocks and blocks[0].get("type") == "text":
         text = blocks[0].get("text", "")
         return is_system_message(text)
     return False
 
 
-def collect_image_paths(
-    uuid: str,
-    by_uuid: dict[str, dict],
-    children_map: dict[str, list[str]],
-    max_depth: int = 10,
-) -> list[str]:
+def image_source_paths(blocks: list[dict]) -> list[str]:
+    """Extract file paths from a record's [Image: source:] text blocks."""
+    paths: list[str] = []
+    for b in blocks:
+        if b.get("type") == "text":
+            text = b.get("text", "")
+            if text.startswith(_IMAGE_SOURCE_PREFIX):
+                # Extract path: "[Image: source: /path/to/file.png]" -> "/path/to/file.png"
+                path = text[_IMAGE_SOURCE_PREFIX_LEN:].strip().rstrip("]")
+                if path:
+                    paths.append(path)
+    return paths
+
+
+def collect_image_paths(uuid: str, index: RecordIndex, max_depth: int = 10) -> list[str]:
     """Collect image paths from [Image: source:] child records.
 
     Traverses children to find text records starting with "[Image: source:"
     and extracts the file paths. This provides consistent image info regardless
     of whether images were embedded in the record or stored as separate children.
     """
+    if not index.image_sources:
+        # No record in the session references an image
+        return []
+
+    by_uuid, children_map = index.by_uuid, index.children_map
     paths: list[str] = []
     visited = {uuid}
-    queue = [(child, 1) for child in children_map.get(uuid, [])]
+    queue = deque((child, 1) for child in children_map.get(uuid, ()))
 
     while queue:
-        kid_uuid, depth = queue.pop(0)
+        kid_uuid, depth = queue.popleft()
         if kid_uuid in visited or depth > max_depth:
             continue
         visited.add(kid_uuid)
@@ -214,45 +368,173 @@ def collect_image_paths(
         if not kid_rec or kid_rec.get("type") != "user":
             continue
 
-        # Check for [Image: source:] text blocks
-        blocks = get_content_blocks(kid_rec.get("message", {}))
-        for b in blocks:
-            if b.get("type") == "text":
-                text = b.get("text", "")
-                if text.startswith("[Image: source:"):
-                    # Extract path: "[Image: source: /path/to/file.png]" -> "/path/to/file.png"
-                    path = text[len("[Image: source:") :].strip().rstrip("]")
-                    if path:
-                        paths.append(path)
+        # Paths from [Image: source:] text blocks, extracted while indexing
+        paths.extend(index.image_sources.get(kid_uuid, ()))
 
         # Continue traversing children
-        for child in children_map.get(kid_uuid, []):
-            if child not in visited:
-                queue.append((child, depth + 1))
+        queue.extend((c, depth + 1) for c in children_map.get(kid_uuid, ()) if c not in visited)
 
     return paths
 
 
-def collect_turns(
-    start_uuid: str,
-    by_uuid: dict[str, dict],
-    children_map: dict[str, list[str]],
-) -> list[Turn]:
-    """BFS traversal to collect turns from a starting user message."""
+def collect_response(uuid: str, index: RecordIndex) -> tuple[list[Block], list[str]]:
+    """BFS below a user message, collecting response blocks up to the next user texts.
+
+    Returns:
+        Tuple of (response_blocks sorted by timestamp, uuids of the next user texts)
+    """
+    by_uuid, children_map = index.by_uuid, index.children_map
+    response_blocks: list[Block] = []
+
+    # BFS to collect all response items and find next user text messages
+    visited = {uuid}
+    queue = deque(children_map.get(uuid, ()))
+    found_user_texts: list[str] = []
+
+    while queue:
+        kid_uuid = queue.popleft()
+        if kid_uuid in visited:
+            continue
+        visited.add(kid_uuid)
+
+        kid_rec = by_uuid.get(kid_uuid)
+        if not kid_rec:
+            continue
+
+        if kid_uuid in index.user_texts:
+            found_user_texts.append(kid_uuid)
+            continue
+
+        # Skip image placeholder records entirely - they're metadata records
+        # created for pasted images, but the image data is in the main message
+        if kid_uuid in index.image_placeholders:
+            # Still need to traverse children
+            queue.extend(c for c in children_map.get(kid_uuid, ()) if c not in visited)
+            continue
+
+        kid_blocks = record_blocks(kid_rec)
+        # All blocks of a record share its HH:MM:SS timestamp
+        ts_full = kid_rec.get("timestamp") or ""
+        timestamp = ts_full[11:19] if ts_full else ""
+
+        for block in kid_blocks:
+            block_type = block.get("type")
+
+            if block_type == "thinking":
+                content, full_content, is_truncated = _truncate_fields(
+                    block.get("thinking", ""), 500
+                )
+                response_blocks.append(
+                    Block(
+                        type=BlockType.THINKING,
+                        content=content,
+                        timestamp=timestamp,
+                        full_content=full_content,
+                        is_truncated=is_truncated,
+                    )
+                )
+            elif block_type == "text":
+                response_blocks.append(
+                    Block(
+                        type=BlockType.TEXT,
+                        content=block.get("text", ""),
+                        timestamp=timestamp,
+                    )
+                )
+            elif block_type == "tool_use":
+                inputs = block.get("input", {})
+                full_tool_input = ""
+                for key in ["command", "prompt", "pattern", "file_path", "query"]:
+                    if key in inputs:
+                        full_tool_input = str(inputs[key])
+                        break
+                else:
+                    full_tool_input = str(inputs)
+
+                tool_input, full_content, is_truncated = _truncate_fields(full_tool_input, 200)
+
+                response_blocks.append(
+                    Block(
+                        type=BlockType.TOOL_USE,
+                        content="",
+                        timestamp=timestamp,
+                        tool_name=_intern(block.get("name", "?")),
+                        tool_input=tool_input,
+                        tool_use_id=block.get("id", ""),
+                        subagent_type=inputs.get("subagent_type"),
+                        full_content=full_content,
+                        is_truncated=is_truncated,
+                    )
+                )
+            elif block_type == "tool_result":
+                content = block.get("content", "")
+                agent_id = extract_agent_id_from_result(content)
+                if isinstance(content, list):
+                    texts = [c.get("text", "") for c in content if isinstance(c, dict)]
+                    content = "\n".join(texts)
+                content, full_content, is_truncated = _truncate_fields(content, 300)
+                response_blocks.append(
+                    Block(
+                        type=BlockType.TOOL_RESULT,
+                        content=content,
+                        timestamp=timestamp,
+                        tool_use_id=block.get("tool_use_id", ""),
+                        child_agent_id=agent_id,
+                        full_content=full_content,
+                        is_truncated=is_truncated,
+                    )
+                )
+
+        queue.extend(c for c in children_map.get(kid_uuid, ()) if c not in visited)
+
+    # Sort blocks by timestamp (always a str here, never None)
+    response_blocks.sort(key=attrgetter("timestamp"))
+
+    # Link agent IDs from tool_result to the most recent preceding tool_use
+    tool_use_index: dict[str | None, Block] = {}
+    for block in response_blocks:
+        if block.type == BlockType.TOOL_USE:
+            tool_use_index[block.tool_use_id] = block
+        elif block.type == BlockType.TOOL_RESULT and block.child_agent_id:
+            tool_use = tool_use_index.get(block.tool_use_id)
+            if tool_use:
+                tool_use.child_agent_id = block.child_agent_id
+
+    return response_blocks, found_user_texts
+
+
+def collect_turns(start_uuid: str, index: RecordIndex) -> list[Turn]:
+    """Collect turns depth-first from a starting user message.
+
+    Turns are numbered in depth-first pre-order and returned in that order.
+    """
+    by_uuid = index.by_uuid
     turns: list[Turn] = []
-    turn_counter = [0]
+    turn_by_id: dict[int, Turn] = {}
+    # A user message reachable by more than one path (e.g. a record duplicated
+    # under two parents) would otherwise have its response subtree re-walked
+    # for every path that reaches it.
+    response_cache: dict[str, tuple[list[Block], list[str]]] = {}
+
+    # Explicit work stack of (user_uuid, parent_turn_id, is_branch, ancestors),
+    # where ancestors holds the user uuids on the path down to this entry
+    stack: list[tuple[str, int | None, bool, frozenset[str]]] = [
+        (start_uuid, None, False, frozenset())
+    ]
 
-    def collect_turn(uuid: str, parent_turn_id: int | None = None) -> Turn | None:
-        rec = by_uuid.get(uuid)
-        if not rec or not is_user_text(rec):
-            return None
+    while stack:
+        uuid, parent_turn_id, is_branch, ancestors = stack.pop()
+        # A uuid duplicated under a descendant makes the parent links cyclic;
+        # stop at a message already on the current path instead of looping
+        if uuid not in index.user_texts or uuid in ancestors:
+            continue
+        rec = by_uuid[uuid]
 
-        current_turn_id = turn_counter[0]
-        turn_counter[0] += 1
+        current_turn_id = len(turns)
 
         # Extract user message text
         user_message = ""
-        blocks = get_content_blocks(rec.get("message", {}))
+        blocks = record_blocks(rec)
         for block in blocks:
             if block.get("type") == "text":
                 if not user_message:  # Take first text block as main message
@@ -260,200 +542,72 @@ def collect_turns(
                     break
 
         # Collect image paths from child [Image: source:] records
-        image_paths = collect_image_paths(uuid, by_uuid, children_map)
+        image_paths = collect_image_paths(uuid, index)
+
+        cached = response_cache.get(uuid)
+        if cached is None:
+            cached = collect_response(uuid, index)
+            response_cache[uuid] = cached
+            response_blocks, found_user_texts = cached
+        else:
+            # Blocks are mutable; give each turn its own copies
+            response_blocks = [copy.copy(b) for b in cached[0]]
+            found_user_texts = cached[1]
 
         turn = Turn(
             id=current_turn_id,
             user_message=user_message,
             user_timestamp=rec.get("timestamp", ""),
+            blocks=response_blocks,
             parent_turn_id=parent_turn_id,
+            is_branch=is_branch,
             is_system=is_system_record(rec),
             image_paths=image_paths,
         )
+        turns.append(turn)
+        turn_by_id[current_turn_id] = turn
+        if parent_turn_id is not None:
+            turn_by_id[parent_turn_id].children_turn_ids.append(current_turn_id)
+
+        # Siblings are branches if the user edited and resent the message.
+        # Push in reverse so the first child is processed next (pre-order).
+        child_is_branch = len(found_user_texts) > 1
+        path = ancestors | {uuid}
+        for user_uuid in reversed(found_user_texts):
+            stack.append((user_uuid, current_turn_id, child_is_branch, path))
 
-        response_blocks: list[Block] = []
-        child_turn_ids: list[int] = []
-
-        # BFS to collect all response items and find next user text messages
-        visited = {uuid}
-        queue = list(children_map.get(uuid, []))
-        found_user_texts: list[str] = []
-
-        while queue:
-            kid_uuid = queue.pop(0)
-            if kid_uuid in visited:
-                continue
-            visited.add(kid_uuid)
-
-            kid_rec = by_uuid.get(kid_uuid)
-            if not kid_rec:
-                continue
-
-            if is_user_text(kid_rec):
-                found_user_texts.append(kid_uuid)
-                continue
-
-            # Skip image placeholder records entirely - they're metadata records
-            # created for pasted images, but the image data is in the main message
-            if is_image_placeholder(kid_rec):
-                # Still need to traverse children
-                for child in children_map.get(kid_uuid, []):
-                    if child not in visited:
-                        queue.append(child)
-                continue
-
-            kid_blocks = get_content_blocks(kid_rec.get("message", {}))
-
-            for block in kid_blocks:
-                block_type = block.get("type")
-                timestamp = kid_rec.get("timestamp", "")[11:19] if kid_rec.get("timestamp") else ""
-
-                if block_type == "thinking":
-                    full_thinking = block.get("thinking", "")
-                    truncated_thinking = truncate(full_thinking, 500)
-                    is_truncated = len(full_thinking) > 500
-                    response_blocks.append(
-                        Block(
-                            type=BlockType.THINKING,
-                            content=truncated_thinking,
-                            timestamp=timestamp,
-                            full_content=full_thinking if is_truncated else None,
-                            is_truncated=is_truncated,
-                        )
-                    )
-                elif block_type == "text":
-                    response_blocks.append(
-                        Block(
-                            type=BlockType.TEXT,
-                            content=block.get("text", ""),
-                            timestamp=timestamp,
-                        )
-                    )
-                elif block_type == "tool_use":
-                    inputs = block.get("input", {})
-                    full_tool_input = ""
-                    for key in ["command", "prompt", "pattern", "file_path", "query"]:
-                        if key in inputs:
-                            full_tool_input = str(inputs[key])
-                            break
-                    else:
-                        full_tool_input = str(inputs)
-
-                    truncated_tool_input = truncate(full_tool_input, 200)
-                    is_truncated = len(full_tool_input) > 200
-
-                    response_blocks.append(
-                        Block(
-                            type=BlockType.TOOL_USE,
-                            content="",
-                            timestamp=timestamp,
-                            tool_name=block.get("name", "?"),
-                            tool_input=truncated_tool_input,
-                            tool_use_id=block.get("id", ""),
-                            subagent_type=inputs.get("subagent_type"),
-                            full_content=full_tool_input if is_truncated else None,
-                            is_truncated=is_truncated,
-                        )
-                    )
-                elif block_type == "tool_result":
-                    content = block.get("content", "")
-                    agent_id = extract_agent_id_from_result(content)
-                    if isinstance(content, list):
-                        texts = [c.get("text", "") for c in content if isinstance(c, dict)]
-                        content = "\n".join(texts)
-                    full_result = str(content)
-                    truncated_result = truncate(full_result, 300)
-                    is_truncated = len(full_result) > 300
-                    response_blocks.append(
-                        Block(
-                            type=BlockType.TOOL_RESULT,
-                            content=truncated_result,
-                            timestamp=timestamp,
-                            tool_use_id=block.get("tool_use_id", ""),
-                            child_agent_id=agent_id,
-                            full_content=full_result if is_truncated else None,
-                            is_truncated=is_truncated,
-                        )
-                    )
-
-            for child in children_map.get(kid_uuid, []):
-                if child not in visited:
-                    queue.append(child)
-
-        # Sort blocks by timestamp
-        response_blocks.sort(key=lambda x: x.timestamp or "")
-
-        # Link agent IDs from tool_result to tool_use
-        for i, block in enumerate(response_blocks):
-            if block.type == BlockType.TOOL_RESULT and block.child_agent_id:
-                tool_use_id = block.tool_use_id
-                for j in range(i - 1, -1, -1):
-                    prev = response_blocks[j]
-                    if prev.type == BlockType.TOOL_USE and prev.tool_use_id == tool_use_id:
-                        prev.child_agent_id = block.child_agent_id
-                        break
-
-        turn.blocks = response_blocks
-
-        # Recursively collect child turns
-        for user_uuid in found_user_texts:
-            child_turn = collect_turn(user_uuid, current_turn_id)
-            if child_turn:
-                child_turn_ids.append(child_turn.id)
-                turns.append(child_turn)
-
-        turn.children_turn_ids = child_turn_ids
-
-        # Mark as branch if multiple children
-        if len(found_user_texts) > 1:
-            for child_id in child_turn_ids:
-                for t in turns:
-                    if t.id == child_id:
-                        t.is_branch = True
-
-        return turn
-
-    root_turn = collect_turn(start_uuid)
-    if root_turn:
-        turns.insert(0, root_turn)
     return turns
 
 
-def find_first_user_text(
-    start_uuid: str,
-    by_uuid: dict[str, dict],
-    children_map: dict[str, list[str]],
-) -> str | None:
+def find_first_user_text(start_uuid: str, index: RecordIndex) -> str | None:
     """BFS to find the first valid user_text message."""
+    children_map = index.children_map
     visited = set()
-    queue = [start_uuid]
+    queue = deque([start_uuid])
 
     while queue:
-        uuid = queue.pop(0)
+        uuid = queue.popleft()
         if uuid in visited:
             continue
         visited.add(uuid)
 
-        rec = by_uuid.get(uuid)
-        if rec and is_user_text(rec):
+        if uuid in index.user_texts:
             return uuid
 
         # Add children to queue
-        for child_uuid in children_map.get(uuid, []):
-            if child_uuid not in visited:
-                queue.append(child_uuid)
+        queue.extend(c for c in children_map.get(uuid, ()) if c not in visited)
 
     return None
 
 
-def build_segments(records: list[dict]) -> list[Segment]:
+def build_segments(records: Iterable[dict]) -> list[Segment]:
     """Group turns into segments based on compact_boundary."""
-    by_uuid, children_map = build_tree(records)
-    roots = find_roots(records, by_uuid)
+    index = index_records(records)
+    by_uuid = index.by_uuid
 
     segments: list[Segment] = []
 
-    for root_uuid in roots:
+    for root_uuid in index.roots:
         root_rec = by_uuid.get(root_uuid)
         if not root_rec:
             continue
@@ -463,20 +617,20 @@ def build_segments(records: list[dict]) -> list[Segment]:
         timestamp = root_rec.get("timestamp", "")
 
         # Find the starting user_text for this segment (BFS search)
-        if is_user_text(root_rec):
+        if root_uuid in index.user_texts:
             start_uuid = root_uuid
             segment_type = "original"
         elif root_subtype == "compact_boundary":
-            start_uuid = find_first_user_text(root_uuid, by_uuid, children_map)
+            start_uuid = find_first_user_text(root_uuid, index)
             segment_type = "continuation"
         else:
-            start_uuid = find_first_user_text(root_uuid, by_uuid, children_map)
+            start_uuid = find_first_user_text(root_uuid, index)
             segment_type = "original"
 
         if not start_uuid:
             continue
 
-        turns = collect_turns(start_uuid, by_uuid, children_map)
+        turns = collect_turns(start_uuid, index)
         if not turns:
             continue
 
@@ -526,7 +680,7 @@ def collect_subagent_blocks(records: list[dict]) -> list[Turn]:
             continue
 
         timestamp = rec.get("timestamp", "")[11:19] if rec.get("timestamp") else ""
-        rec_blocks = get_content_blocks(rec.get("message", {}))
+        rec_blocks = record_blocks(rec)
 
         for block in rec_blocks:
             block_type = block.get("type")
@@ -536,15 +690,15 @@ def collect_subagent_blocks(records: list[dict]) -> list[Turn]:
                 continue
 
             if block_type == "thinking":
-                full_thinking = block.get("thinking", "")
-                truncated_thinking = truncate(full_thinking, 500)
-                is_truncated = len(full_thinking) > 500
+                content, full_content, is_truncated = _truncate_fields(
+                    block.get("thinking", ""), 500
+                )
                 blocks.append(
                     Block(
                         type=BlockType.THINKING,
-                        content=truncated_thinking,
+                        content=content,
                         timestamp=timestamp,
-                        full_content=full_thinking if is_truncated else None,
+                        full_content=full_content,
                         is_truncated=is_truncated,
                     )
                 )
@@ -566,19 +720,18 @@ def collect_subagent_blocks(records: list[dict]) -> list[Turn]:
                 else:
                     full_tool_input = str(inputs)
 
-                truncated_tool_input = truncate(full_tool_input, 200)
-                is_truncated = len(full_tool_input) > 200
+                tool_input, full_content, is_truncated = _truncate_fields(full_tool_input, 200)
 
                 blocks.append(
                     Block(
                         type=BlockType.TOOL_USE,
                         content="",
                         timestamp=timestamp,
-                        tool_name=block.get("name", "?"),
-                        tool_input=truncated_tool_input,
+                        tool_name=_intern(block.get("name", "?")),
+                        tool_input=tool_input,
                         tool_use_id=block.get("id", ""),
                         subagent_type=inputs.get("subagent_type"),
-                        full_content=full_tool_input if is_truncated else None,
+                        full_content=full_content,
                         is_truncated=is_truncated,
                     )
                 )
@@ -588,17 +741,15 @@ def collect_subagent_blocks(records: list[dict]) -> list[Turn]:
                 if isinstance(content, list):
                     texts = [c.get("text", "") for c in content if isinstance(c, dict)]
                     content = "\n".join(texts)
-                full_result = str(content)
-                truncated_result = truncate(full_result, 300)
-                is_truncated = len(full_result) > 300
+                content, full_content, is_truncated = _truncate_fields(content, 300)
                 blocks.append(
                     Block(
                         type=BlockType.TOOL_RESULT,
-                        content=truncated_result,
+                        content=content,
                         timestamp=timestamp,
                         tool_use_id=block.get("tool_use_id", ""),
                         child_agent_id=agent_id,
-                        full_content=full_result if is_truncated else None,
+                        full_content=full_content,
                         is_truncated=is_truncated,
                     )
                 )
@@ -622,18 +773,39 @@ def collect_subagent_blocks(records: list[dict]) -> list[Turn]:
     ]
 
 
+def _parse_subagent_file(path: str) -> tuple[str, list[Turn]]:
+    """Parse one subagent JSONL file into (agent_id, turns)."""
+    name = os.path.basename(path)
+    agent_id = name[: -len(".jsonl")].replace("agent-", "")
+    return agent_id, collect_subagent_blocks(load_records(Path(path)))
+
+
 def load_subagents(session_dir: Path) -> dict[str, list[Turn]]:
-    """Load all subagent JSONL files from subagents/ directory."""
+    """Load all subagent JSONL files from subagents/ directory.
+
+    Files are independent, so beyond a couple of them they are parsed in
+    parallel worker processes.
+    """
     subagents: dict[str, list[Turn]] = {}
     subagent_dir = session_dir / "subagents"
 
     if not subagent_dir.exists():
         return subagents
 
-    for f in subagent_dir.glob("*.jsonl"):
-        agent_id = f.stem.replace("agent-", "")
-        records = load_records(f)
-        turns = collect_subagent_blocks(records)
+    # scandir yields names without constructing a Path per entry
+    with os.scandir(subagent_dir) as it:
+        paths = [entry.path for entry in it if entry.name.endswith(".jsonl") and entry.is_file()]
+
+    if len(paths) > _PARALLEL_SUBAGENT_THRESHOLD:
+        # fork skips re-importing the package in each worker
+        mp_context = multiprocessing.get_context("fork") if sys.platform == "linux" else None
+        max_workers = min(8, os.cpu_count() or 1, len(paths))
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as pool:
+            results = list(pool.map(_parse_subagent_file, paths))
+    else:
+        results = [_parse_subagent_file(path) for path in paths]
+
+    for agent_id, turns in results:
         if turns:
             subagents[agent_id] = turns
 
@@ -650,14 +822,12 @@ def build_subagent_turns(records: list[dict]) -> list[Turn]:
 
 def parse_session(jsonl_path: Path) -> Session:
     """Main entry point: JSONL path -> Session model."""
-    records = load_records(jsonl_path)
+    # Partition records while streaming: main session vs inline subagents
+    main_records, subagent_groups = partition_by_subagent(iter_records(jsonl_path))
 
-    if not records:
+    if not main_records and not subagent_groups:
         return Session(segments=[], subagents={})
 
-    # Partition records: main session vs inline subagents
-    main_records, subagent_groups = partition_by_subagent(records)
-
     # Build main session segments (only from non-subagent records)
     segments = build_segments(main_records)
 
@@ -675,3 +845,78 @@ def parse_session(jsonl_path: Path) -> Session:
     subagents = {**inline_subagents, **external_subagents}
 
     return Session(segments=segments, subagents=subagents)
+
+
+# Bump whenever parse_session output changes, so stale snapshots are ignored.
+# Snapshots are also tied to the installed cc-flow version (_snapshot_version).
+_SESSION_CACHE_VERSION = 1
+
+
+class _SessionSnapshot(msgspec.Struct):
+    """A parsed Session stored with the input file stats it was built from."""
+
+    version: str
+    inputs: list[tuple[str, int, int]]
+    session: Session
+
+
+def _session_inputs(jsonl_path: Path) -> list[tuple[str, int, int]]:
+    """(path, size, mtime_ns) of the session file and its subagent files."""
+    st = jsonl_path.stat()
+    inputs = [(str(jsonl_path), st.st_size, st.st_mtime_ns)]
+    subagent_dir = jsonl_path.parent / jsonl_path.stem / "subagents"
+    try:
+        with os.scandir(subagent_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".jsonl") and entry.is_file():
+                    est = entry.stat()
+                    inputs.append((entry.path, est.st_size, est.st_mtime_ns))
+    except FileNotFoundError:
+        pass
+    inputs.sort()
+    return inputs
+
+
+def _snapshot_version() -> str:
+    """Snapshot format version combined with the installed package version."""
+    try:
+        package_version = importlib.metadata.version("cc-flow")
+    except importlib.metadata.PackageNotFoundError:
+        package_version = "unknown"
+    return f"{_SESSION_CACHE_VERSION}:{package_version}"
+
+
+def parse_session_cached(jsonl_path: Path, cache_dir: Path) -> Session:
+    """parse_session, reusing a snapshot in cache_dir while the inputs are unchanged.
+
+    Snapshots are msgpack-encoded and keyed on the size and mtime of the
+    session file and each subagent file, so an appended record or a new
+    subagent forces a fresh parse. Upgrading cc-flow invalidates every
+    snapshot. An unreadable cache is treated as a miss.
+    """
+    jsonl_path = jsonl_path.resolve()
+    version = _snapshot_version()
+    inputs = _session_inputs(jsonl_path)
+    name = hashlib.sha256(str(jsonl_path).encode()).hexdigest()[:32]
+    cache_path = cache_dir / f"{name}.msgpack"
+
+    try:
+        snapshot = msgspec.msgpack.decode(cache_path.read_bytes(), type=_SessionSnapshot)
+    except (OSError, msgspec.DecodeError):
+        snapshot = None
+    if snapshot and snapshot.version == version and snapshot.inputs == inputs:
+        return snapshot.session
+
+    session = parse_session(jsonl_path)
+    snapshot = _SessionSnapshot(version=version, inputs=inputs, session=session)
+    # Write then rename, so a concurrent reader never sees a partial file
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(msgspec.msgpack.encode(snapshot))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # e.g. ENOSPC partway through the write; don't leave the temp file
+        with contextlib.suppress(OSError):
+            tmp_path.unlink(missing_ok=True)
+    return session
@@ -1,15 +1,24 @@
 """HTML renderer for session visualization."""
 
-import base64
-import json
+import contextlib
 import mimetypes
+import pickle
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
-from jinja2 import Environment, FileSystemLoader
+import msgspec
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader, Template
+from jinja2.bccache import Bucket
 
 from .models import Block, BlockType, CompactMetadata, Segment, Session, Turn
 
+try:
+    # SIMD-accelerated, API-compatible with the stdlib module (cc-flow[fast])
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 
 def image_to_data_url(path: str) -> str | None:
     """Read an image file and convert to base64 data URL."""
@@ -32,112 +41,79 @@ def image_to_data_url(path: str) -> str | None:
 
 
 def json_for_html(data: Any) -> str:
-    """Safely encode JSON for embedding in HTML script tags."""
-    json_str = json.dumps(data, ensure_ascii=False)
-    # Escape </script> and <!-- to prevent HTML injection
-    json_str = json_str.replace("</script>", "</scr\\u0069pt>")
-    json_str = json_str.replace("<!--", "<\\u0021--")
-    return json_str
+    """Safely encode JSON for embedding in HTML script tags.
+
+    Every "<" is written as its \\u003c escape. JSON syntax never uses "<"
+    outside strings, so this is lossless, and it rules out "</script>" and
+    "<!--" by construction in a single pass over the encoded bytes.
+    """
+    raw = msgspec.json.encode(data).replace(b"<", b"\\u003c")
+    return raw.decode("utf-8")
+
 
+def process_images(
+    paths: list[str], embed: bool, data_urls: dict[str, str | None] | None = None
+) -> list[dict]:
+    """Process image paths, optionally embedding as data URLs.
 
-def process_images(paths: list[str], embed: bool) -> list[dict]:
-    """Process image paths, optionally embedding as data URLs."""
+    data_urls memoizes encoded images by path. _session_payload passes one per
+    render, so an image shared across turns is read and encoded only once.
+    """
+    if data_urls is None:
+        data_urls = {}
     images = []
     for path in paths:
         img = {"path": path}
         if embed:
-            data_url = image_to_data_url(path)
+            if path in data_urls:
+                data_url = data_urls[path]
+            else:
+                data_url = data_urls[path] = image_to_data_url(path)
             if data_url:
                 img["data_url"] = data_url
         images.append(img)
     return images
 
 
-def session_to_dict(session: Session, embed_images: bool = False) -> dict:
-    """Convert Session model to dict for JSON serialization."""
-    segments = []
-    for seg in session.segments:
-        turns = []
-        for turn in seg.turns:
-            blocks = []
-            for block in turn.blocks:
-                blocks.append(
-                    {
-                        "type": block.type.value,
-                        "content": block.content,
-                        "timestamp": block.timestamp,
-                        "tool_name": block.tool_name,
-                        "tool_input": block.tool_input,
-                        "tool_use_id": block.tool_use_id,
-                        "child_agent_id": block.child_agent_id,
-                        "subagent_type": block.subagent_type,
-                        "full_content": block.full_content,
-                        "is_truncated": block.is_truncated,
-                    }
-                )
-            turns.append(
-                {
-                    "id": turn.id,
-                    "user_message": turn.user_message,
-                    "user_timestamp": turn.user_timestamp,
-                    "blocks": blocks,
-                    "parent_turn_id": turn.parent_turn_id,
-                    "children_turn_ids": turn.children_turn_ids,
-                    "is_branch": turn.is_branch,
-                    "is_system": turn.is_system,
-                    "images": process_images(turn.image_paths, embed_images),
-                }
-            )
-        segments.append(
-            {
-                "id": seg.id,
-                "type": seg.type,
-                "timestamp": seg.timestamp,
-                "turns": turns,
-                "compact_metadata": {
-                    "trigger": seg.compact_metadata.trigger,
-                    "pre_tokens": seg.compact_metadata.pre_tokens,
-                }
-                if seg.compact_metadata
-                else None,
-            }
-        )
+def _turn_payload(turn: Turn, embed_images: bool, data_urls: dict[str, str | None]) -> dict:
+    """JSON form of a Turn, with image paths resolved and blocks left as Structs."""
+    return {
+        "id": turn.id,
+        "user_message": turn.user_message,
+        "user_timestamp": turn.user_timestamp,
+        "blocks": turn.blocks,
+        "parent_turn_id": turn.parent_turn_id,
+        "children_turn_ids": turn.children_turn_ids,
+        "is_branch": turn.is_branch,
+        "is_system": turn.is_system,
+        "images": process_images(turn.image_paths, embed_images, data_urls),
+    }
 
-    # Convert subagents
-    subagents = {}
-    for agent_id, turns in session.subagents.items():
-        agent_turns = []
-        for turn in turns:
-            blocks = []
-            for block in turn.blocks:
-                blocks.append(
-                    {
-                        "type": block.type.value,
-                        "content": block.content,
-                        "timestamp": block.timestamp,
-                        "tool_name": block.tool_name,
-                        "tool_input": block.tool_input,
-                        "tool_use_id": block.tool_use_id,
-                        "child_agent_id": block.child_agent_id,
-                        "subagent_type": block.subagent_type,
-                        "full_content": block.full_content,
-                        "is_truncated": block.is_truncated,
-                    }
-                )
-            agent_turns.append(
-                {
-                    "id": turn.id,
-                    "user_message": turn.user_message,
-                    "user_timestamp": turn.user_timestamp,
-                    "blocks": blocks,
-                    "parent_turn_id": turn.parent_turn_id,
-                    "children_turn_ids": turn.children_turn_ids,
-                    "is_branch": turn.is_branch,
-                    "is_system": turn.is_system,
-                    "images": process_images(turn.image_paths, embed_images),
-                }
-            )
-        subagents[agent_id] = agent_turns
+
+def _session_payload(session: Session, embed_images: bool) -> dict:
+    """Encoder-ready form of a Session.
+
+    Blocks and compaction metadata map one-to-one onto their JSON form, so they
+    stay Structs and msgspec encodes them directly. Only turns need reshaping,
+    since image_paths is exposed as "images" entries.
+    """
+    # Encoded images for this render only; shared paths are encoded once
+    data_urls: dict[str, str | None] = {}
+    segments = [
+        {
+            "id": seg.id,
+            "type": seg.type,
+            "timestamp": seg.timestamp,
+            "turns": [_turn_payload(turn, embed_images, data_urls) for turn in seg.turns],
+            "compact_metadata": seg.compact_metadata,
+        }
+        for seg in session.segments
+    ]
+
+    subagents = {
+        agent_id: [_turn_payload(turn, embed_images, data_urls) for turn in turns]
+        for agent_id, turns in session.subagents.items()
+    }
 
     return {
         "segments": segments,
@@ -145,6 +121,33 @@ def session_to_dict(session: Session, embed_images: bool = False) -> dict:
     }
 
 
+def session_to_dict(session: Session, embed_images: bool = False) -> dict:
+    """Convert Session model to dict for JSON serialization."""
+    return msgspec.to_builtins(_session_payload(session, embed_images))
+
+
+# BlockType members by value; a plain dict lookup is cheaper than BlockType(value)
+_BLOCK_TYPES_BY_VALUE = {member.value: member for member in BlockType}
+
+
+def _block_from_dict(block_data: dict) -> Block:
+    """Convert a JSON block dict back to a Block."""
+    block_type = block_data["type"]
+    return Block(
+        # Fall back to the enum constructor so unknown types still raise ValueError
+        type=_BLOCK_TYPES_BY_VALUE.get(block_type) or BlockType(block_type),
+        content=block_data.get("content", ""),
+        timestamp=block_data.get("timestamp"),
+        tool_name=block_data.get("tool_name"),
+        tool_input=block_data.get("tool_input"),
+        tool_use_id=block_data.get("tool_use_id"),
+        child_agent_id=block_data.get("child_agent_id"),
+        subagent_type=block_data.get("subagent_type"),
+        full_content=block_data.get("full_content"),
+        is_truncated=block_data.get("is_truncated", False),
+    )
+
+
 def dict_to_session(data: dict) -> Session:
     """Convert JSON dict back to Session model.
 
@@ -155,22 +158,7 @@ def dict_to_session(data: dict) -> Session:
     for seg_data in data.get("segments", []):
         turns = []
         for turn_data in seg_data.get("turns", []):
-            blocks = []
-            for block_data in turn_data.get("blocks", []):
-                blocks.append(
-                    Block(
-                        type=BlockType(block_data["type"]),
-                        content=block_data.get("content", ""),
-                        timestamp=block_data.get("timestamp"),
-                        tool_name=block_data.get("tool_name"),
-                        tool_input=block_data.get("tool_input"),
-                        tool_use_id=block_data.get("tool_use_id"),
-                        child_agent_id=block_data.get("child_agent_id"),
-                        subagent_type=block_data.get("subagent_type"),
-                        full_content=block_data.get("full_content"),
-                        is_truncated=block_data.get("is_truncated", False),
-                    )
-                )
+            blocks = [_block_from_dict(block_data) for block_data in turn_data.get("blocks", [])]
 
             image_paths = [img["path"] for img in turn_data.get("images", [])]
 
@@ -210,22 +198,7 @@ def dict_to_session(data: dict) -> Session:
     for agent_id, turns_data in data.get("subagents", {}).items():
         agent_turns = []
         for turn_data in turns_data:
-            blocks = []
-            for block_data in turn_data.get("blocks", []):
-                blocks.append(
-                    Block(
-                        type=BlockType(block_data["type"]),
-                        content=block_data.get("content", ""),
-                        timestamp=block_data.get("timestamp"),
-                        tool_name=block_data.get("tool_name"),
-                        tool_input=block_data.get("tool_input"),
-                        tool_use_id=block_data.get("tool_use_id"),
-                        child_agent_id=block_data.get("child_agent_id"),
-                        subagent_type=block_data.get("subagent_type"),
-                        full_content=block_data.get("full_content"),
-                        is_truncated=block_data.get("is_truncated", False),
-                    )
-                )
+            blocks = [_block_from_dict(block_data) for block_data in turn_data.get("blocks", [])]
 
             image_paths = [img["path"] for img in turn_data.get("images", [])]
 
@@ -268,17 +241,25 @@ def compute_metadata(session: Session, jsonl_path: Path) -> dict:
 
 def render_json(session: Session, jsonl_path: Path, compact: bool = False) -> str:
     """Render session as JSON string."""
-    data = session_to_dict(session)
+    data = _session_payload(session, embed_images=False)
     metadata = compute_metadata(session, jsonl_path)
 
     # Put metadata first in output
     ordered = {"metadata": metadata, **data}
 
-    return json.dumps(ordered, indent=None if compact else 2)
+    encoded = msgspec.json.encode(ordered)
+    if not compact:
+        encoded = msgspec.json.format(encoded, indent=2)
+    return encoded.decode("utf-8")
 
 
+@lru_cache(maxsize=1)
 def load_assets() -> dict[str, str]:
-    """Load bundled JS/CSS assets for inline embedding."""
+    """Load bundled JS/CSS assets for inline embedding.
+
+    The assets ship with the package and never change at runtime, so they are
+    read once per process. Callers must not mutate the returned dict.
+    """
     assets_dir = Path(__file__).parent / "assets"
     assets = {}
 
@@ -290,22 +271,79 @@ def load_assets() -> dict[str, str]:
         "app.js",
     ]:
         asset_path = assets_dir / name
+        key = name.replace(".", "_").replace("-", "_")
         if asset_path.exists():
-            assets[name.replace(".", "_").replace("-", "_")] = asset_path.read_text()
+            # Explicit UTF-8 decode skips text-mode newline translation
+            assets[key] = asset_path.read_bytes().decode("utf-8")
         else:
-            assets[name.replace(".", "_").replace("-", "_")] = ""
+            assets[key] = ""
 
     return assets
 
 
+class _BestEffortBytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that treats disk errors as a cache miss.
+
+    The cache only saves compile time, so a full disk, a cache directory
+    removed by a tmp cleaner, or a corrupt entry must never fail a render.
+    """
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        try:
+            super().load_bytecode(bucket)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            bucket.reset()
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        with contextlib.suppress(OSError):
+            super().dump_bytecode(bucket)
+
+
+@lru_cache(maxsize=1)
+def _get_env() -> Environment:
+    """Jinja environment for the bundled templates, created on first render.
+
+    Compiled template bytecode is cached on disk (in a private per-user temp
+    directory), so later CLI runs skip lexing and parsing base.html.j2.
+    """
+    try:
+        bytecode_cache = _BestEffortBytecodeCache()
+    except (OSError, RuntimeError):
+        # No usable cache directory; compile in memory as before
+        bytecode_cache = None
+    return Environment(
+        loader=PackageLoader("cc_flow", "templates"),
+        autoescape=False,
+        bytecode_cache=bytecode_cache,
+    )
+
+
+@lru_cache(maxsize=1)
+def _get_template() -> Template:
+    """Compile the HTML template on first use and reuse it afterwards.
+
+    The inline assets are bound as template globals here, so each render only
+    has to pass the session JSON.
+    """
+    return _get_env().get_template("base.html.j2", globals=load_assets())
+
+
+def _template_context(session: Session, embed_images: bool) -> dict[str, str]:
+    """Per-render variables for base.html.j2: the embedded session JSON."""
+    data = _session_payload(session, embed_images=embed_images)
+    return {"session_json": json_for_html(data)}
+
+
 def render(session: Session, embed_images: bool = False) -> str:
     """Render Session to self-contained HTML string."""
-    template_dir = Path(__file__).parent / "templates"
-    env = Environment(loader=FileSystemLoader(template_dir), autoescape=False)
-    template = env.get_template("base.html.j2")
+    return _get_template().render(**_template_context(session, embed_images))
+
 
-    data = session_to_dict(session, embed_images=embed_images)
-    session_json = json_for_html(data)
-    assets = load_assets()
+def render_to_file(session: Session, output: Path, embed_images: bool = False) -> None:
+    """Render Session to a self-contained HTML file.
 
-    return template.render(session_json=session_json, **assets)
+    Streams the template output to disk instead of building the whole page as
+    one string first, which keeps peak memory near the size of the payload.
+    """
+    stream = _get_template().stream(**_template_context(session, embed_images))
+    stream.dump(str(output), encoding="utf-8")
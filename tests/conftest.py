@@ -1,47 +1,83 @@
 """Pytest configuration and fixtures."""
 
+import os
 from pathlib import Path
 
 import pytest
+from hypothesis import settings
 
+from cc_flow.models import Session
+from cc_flow.parser import parse_session
+from cc_flow.renderer import render, render_json
 
-@pytest.fixture
+# Hypothesis example budgets: "dev" keeps local runs quick, "ci" is the
+# thorough run. Select with HYPOTHESIS_PROFILE=ci.
+settings.register_profile("dev", max_examples=10, deadline=None)
+settings.register_profile("ci", max_examples=50, deadline=None)
+settings.load_profile(os.environ.get("HYPOTHESIS_PROFILE", "dev"))
+
+
+@pytest.fixture(scope="session")
 def fixtures_dir() -> Path:
     """Return the fixtures directory path."""
     return Path(__file__).parent / "fixtures"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def simple_session(fixtures_dir: Path) -> Path:
     """Return path to simple.jsonl fixture."""
     return fixtures_dir / "simple.jsonl"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def with_branches_session(fixtures_dir: Path) -> Path:
     """Return path to with_branches.jsonl fixture."""
     return fixtures_dir / "with_branches.jsonl"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def with_compaction_session(fixtures_dir: Path) -> Path:
     """Return path to with_compaction.jsonl fixture."""
     return fixtures_dir / "with_compaction.jsonl"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def with_subagent_session(fixtures_dir: Path) -> Path:
     """Return path to with_subagent.jsonl fixture."""
     return fixtures_dir / "with_subagent.jsonl"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def with_images_session(fixtures_dir: Path) -> Path:
     """Return path to with_images.jsonl fixture."""
     return fixtures_dir / "with_images.jsonl"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def with_inline_subagent_session(fixtures_dir: Path) -> Path:
     """Return path to with_inline_subagent.jsonl fixture."""
     return fixtures_dir / "with_inline_subagent.jsonl"
+
+
+@pytest.fixture(scope="module")
+def simple_session_parsed(simple_session: Path) -> Session:
+    """Return simple.jsonl parsed once per module (treat as read-only)."""
+    return parse_session(simple_session)
+
+
+@pytest.fixture(scope="module")
+def with_compaction_session_parsed(with_compaction_session: Path) -> Session:
+    """Return with_compaction.jsonl parsed once per module (treat as read-only)."""
+    return parse_session(with_compaction_session)
+
+
+@pytest.fixture(scope="module")
+def simple_rendered_html(simple_session_parsed: Session) -> str:
+    """Return the HTML for simple.jsonl, rendered once per module."""
+    return render(simple_session_parsed)
+
+
+@pytest.fixture(scope="module")
+def simple_rendered_json(simple_session_parsed: Session, simple_session: Path) -> str:
+    """Return the pretty-printed transcript JSON for simple.jsonl, once per module."""
+    return render_json(simple_session_parsed, simple_session)
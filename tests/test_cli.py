@@ -0,0 +1,35 @@
+"""Tests for the CLI commands."""
+
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from cc_flow.cli import app
+
+runner = CliRunner()
+
+
+class TestTranscript:
+    """Tests for the transcript command."""
+
+    def test_output_file_is_utf8(self, tmp_path: Path) -> None:
+        """Non-ASCII text is written as UTF-8 regardless of the locale encoding."""
+        text = "日本語のテスト 🚀 café"
+        session_file = tmp_path / "unicode.jsonl"
+        record = {
+            "uuid": "msg-001",
+            "type": "user",
+            "timestamp": "2026-01-17T10:00:00Z",
+            "message": {"content": [{"type": "text", "text": text}]},
+        }
+        session_file.write_text(json.dumps(record) + "\n", encoding="utf-8")
+        output = tmp_path / "out.json"
+
+        result = runner.invoke(app, ["transcript", str(session_file), "-o", str(output)])
+
+        assert result.exit_code == 0, result.output
+        raw = output.read_bytes()
+        assert text.encode("utf-8") in raw
+        data = json.loads(raw.decode("utf-8"))
+        assert data["segments"][0]["turns"][0]["user_message"] == text
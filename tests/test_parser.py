@@ -4,15 +4,18 @@ from pathlib import Path
 
 import pytest
 
-from cc_flow.models import BlockType
+from cc_flow import parser
+from cc_flow.models import BlockType, Session
 from cc_flow.parser import (
     build_segments,
     get_content_blocks,
+    index_records,
     is_image_placeholder,
     is_system_message,
     is_user_text,
     load_records,
     parse_session,
+    parse_session_cached,
     partition_by_subagent,
     truncate,
 )
@@ -55,6 +58,18 @@ class TestLoadRecords:
         captured = capsys.readouterr()
         assert "Warning: Skipping malformed JSON at line 2" in captured.err
 
+    def test_memory_mapped_path(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+    ) -> None:
+        """Files above the mmap threshold parse the same as small files."""
+        monkeypatch.setattr(parser, "_MMAP_THRESHOLD", 0)
+        f = tmp_path / "test.jsonl"
+        f.write_text('{"type": "user"}\n\nnot json\n{"type": "progress"}\n{"type": "assistant"}')
+        records = load_records(f)
+        assert [r["type"] for r in records] == ["user", "assistant"]
+        captured = capsys.readouterr()
+        assert "Warning: Skipping malformed JSON at line 3" in captured.err
+
 
 class TestHelpers:
     """Tests for helper functions."""
@@ -160,6 +175,84 @@ class TestParseSession:
         assert len(turn2.image_paths) == 0
 
 
+class TestParseSessionCached:
+    """Tests for parse_session_cached function."""
+
+    def test_matches_parse_session(self, with_subagent_session: Path, tmp_path: Path) -> None:
+        """Cold and warm reads both return what parse_session does."""
+        expected = parse_session(with_subagent_session)
+        assert parse_session_cached(with_subagent_session, tmp_path) == expected
+        assert len(list(tmp_path.glob("*.msgpack"))) == 1
+        assert parse_session_cached(with_subagent_session, tmp_path) == expected
+
+    def test_reuses_snapshot(
+        self, simple_session: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """An unchanged session is not parsed again."""
+        parse_session_cached(simple_session, tmp_path)
+
+        def fail(path: Path) -> None:
+            raise AssertionError("session was re-parsed")
+
+        monkeypatch.setattr(parser, "parse_session", fail)
+        assert len(parse_session_cached(simple_session, tmp_path).segments) == 1
+
+    def test_append_invalidates(self, simple_session: Path, tmp_path: Path) -> None:
+        """Appending a record to the session forces a fresh parse."""
+        session_file = tmp_path / "session.jsonl"
+        session_file.write_bytes(simple_session.read_bytes())
+        cache_dir = tmp_path / "cache"
+        before = parse_session_cached(session_file, cache_dir)
+
+        with session_file.open("a") as f:
+            f.write(
+                '{"type":"user","uuid":"u-new","parentUuid":null,'
+                '"timestamp":"2026-01-25T11:00:00Z","message":{"content":"Another"}}\n'
+            )
+        after = parse_session_cached(session_file, cache_dir)
+        assert after == parse_session(session_file)
+        assert after != before
+
+    def test_package_upgrade_invalidates(
+        self, simple_session: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """A snapshot written by another cc-flow version is not reused."""
+        parse_session_cached(simple_session, tmp_path)
+        monkeypatch.setattr(parser.importlib.metadata, "version", lambda name: "999.0")
+        calls: list[Path] = []
+        real_parse = parser.parse_session
+
+        def counting(path: Path) -> Session:
+            calls.append(path)
+            return real_parse(path)
+
+        monkeypatch.setattr(parser, "parse_session", counting)
+        parse_session_cached(simple_session, tmp_path)
+        assert len(calls) == 1
+
+    def test_failed_write_leaves_no_temp_file(
+        self, simple_session: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """A write that fails partway removes its temp file and still returns the session."""
+
+        def partial_write(self: Path, data: bytes) -> int:
+            with self.open("wb") as f:
+                f.write(data[:10])
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(Path, "write_bytes", partial_write)
+        session = parse_session_cached(simple_session, tmp_path)
+        assert len(session.segments) == 1
+        assert list(tmp_path.iterdir()) == []
+
+    def test_corrupt_snapshot_ignored(self, simple_session: Path, tmp_path: Path) -> None:
+        """An unreadable snapshot is treated as a cache miss."""
+        parse_session_cached(simple_session, tmp_path)
+        (snapshot,) = tmp_path.glob("*.msgpack")
+        snapshot.write_bytes(b"not msgpack")
+        assert parse_session_cached(simple_session, tmp_path) == parse_session(simple_session)
+
+
 class TestBuildSegments:
     """Tests for build_segments function."""
 
@@ -205,6 +298,109 @@ class TestBuildSegments:
         assert len(segments[0].turns[0].blocks) == 1
         assert segments[0].turns[0].blocks[0].type == BlockType.TEXT
 
+    def test_user_message_with_two_parents(self) -> None:
+        """A user record listed under two parents yields two turns with separate blocks."""
+
+        def user(uuid: str, parent: str | None, text: str) -> dict:
+            rec = {
+                "uuid": uuid,
+                "type": "user",
+                "timestamp": f"2026-01-17T10:00:0{uuid}Z",
+                "message": {"content": [{"type": "text", "text": text}]},
+            }
+            if parent:
+                rec["parentUuid"] = parent
+            return rec
+
+        records = [
+            user("1", None, "hello"),
+            {
+                "uuid": "2",
+                "type": "assistant",
+                "parentUuid": "1",
+                "timestamp": "2026-01-17T10:00:02Z",
+                "message": {"content": [{"type": "text", "text": "hi"}]},
+            },
+            user("3", "2", "first edit"),
+            user("4", "2", "second edit"),
+            # Same record written under both edits
+            user("5", "3", "follow-up"),
+            user("5", "4", "follow-up"),
+            {
+                "uuid": "6",
+                "type": "assistant",
+                "parentUuid": "5",
+                "timestamp": "2026-01-17T10:00:06Z",
+                "message": {"content": [{"type": "text", "text": "done"}]},
+            },
+        ]
+        segments = build_segments(records)
+        follow_ups = [t for t in segments[0].turns if t.user_message == "follow-up"]
+        assert len(follow_ups) == 2
+        assert follow_ups[0].blocks == follow_ups[1].blocks
+        assert follow_ups[0].blocks[0] is not follow_ups[1].blocks[0]
+
+    def test_duplicated_uuid_parent_cycle(self) -> None:
+        """A user uuid re-parented under its own descendant does not loop forever."""
+
+        def record(uuid: str, rec_type: str, parent: str | None) -> dict:
+            rec = {
+                "uuid": uuid,
+                "type": rec_type,
+                "timestamp": "2026-01-17T10:00:00Z",
+                "message": {"content": [{"type": "text", "text": uuid}]},
+            }
+            if parent:
+                rec["parentUuid"] = parent
+            return rec
+
+        # u1 -> a1 -> u2 -> a2 -> u1 (second u1 record points back at a2)
+        records = [
+            record("u1", "user", None),
+            record("a1", "assistant", "u1"),
+            record("u2", "user", "a1"),
+            record("a2", "assistant", "u2"),
+            record("u1", "user", "a2"),
+        ]
+        segments = build_segments(records)
+        assert len(segments) == 1
+        turns = segments[0].turns
+        assert [t.user_message for t in turns] == ["u1", "u2"]
+        assert turns[1].parent_turn_id == 0
+        assert turns[1].children_turn_ids == []
+
+
+class TestIndexRecords:
+    """Tests for index_records function."""
+
+    def test_classifies_user_records(self) -> None:
+        """User texts and image placeholders are classified while indexing."""
+        records = [
+            {"uuid": "1", "type": "user", "message": {"content": "hello"}},
+            {
+                "uuid": "2",
+                "type": "assistant",
+                "parentUuid": "1",
+                "message": {"content": [{"type": "text", "text": "hi"}]},
+            },
+            {
+                "uuid": "3",
+                "type": "user",
+                "parentUuid": "2",
+                "message": {"content": [{"type": "tool_result", "content": "ok"}]},
+            },
+            {
+                "uuid": "4",
+                "type": "user",
+                "parentUuid": "1",
+                "message": {"content": [{"type": "text", "text": "[Image: source: /a.png]"}]},
+            },
+        ]
+        index = index_records(records)
+        assert index.roots == ["1"]
+        assert index.user_texts == {"1"}
+        assert index.image_placeholders == {"4"}
+
 
 class TestIsImagePlaceholder:
     """Tests for is_image_placeholder detection."""
@@ -310,131 +506,77 @@ class TestIsSystemMessage:
         assert is_system_message(text) is expected
 
 
+def _response_records(block_type: BlockType, text: str) -> list[dict]:
+    """Records for one user turn whose response has a single block carrying text."""
+    user = {
+        "uuid": "1",
+        "type": "user",
+        "timestamp": "2026-01-17T10:00:00Z",
+        "message": {"content": [{"type": "text", "text": "hello"}]},
+    }
+
+    def assistant(block: dict) -> dict:
+        return {
+            "uuid": "2",
+            "type": "assistant",
+            "parentUuid": "1",
+            "timestamp": "2026-01-17T10:00:05Z",
+            "message": {"content": [block]},
+        }
+
+    if block_type == BlockType.THINKING:
+        return [user, assistant({"type": "thinking", "thinking": text})]
+    if block_type == BlockType.TOOL_USE:
+        tool_use = {"type": "tool_use", "id": "tool1", "name": "Bash", "input": {"command": text}}
+        return [user, assistant(tool_use)]
+    return [
+        user,
+        assistant({"type": "tool_use", "id": "tool1", "name": "Bash", "input": {}}),
+        {
+            "uuid": "3",
+            "type": "user",
+            "parentUuid": "2",
+            "timestamp": "2026-01-17T10:00:10Z",
+            "message": {
+                "content": [{"type": "tool_result", "tool_use_id": "tool1", "content": text}]
+            },
+        },
+    ]
+
+
 class TestBlockTruncation:
     """Tests for block truncation with full_content preservation."""
 
-    def test_thinking_truncated_at_500(self) -> None:
-        """Thinking blocks truncate at 500 chars."""
-        long_thinking = "x" * 600
-        records = [
-            {
-                "uuid": "1",
-                "type": "user",
-                "timestamp": "2026-01-17T10:00:00Z",
-                "message": {"content": [{"type": "text", "text": "hello"}]},
-            },
-            {
-                "uuid": "2",
-                "type": "assistant",
-                "parentUuid": "1",
-                "timestamp": "2026-01-17T10:00:05Z",
-                "message": {"content": [{"type": "thinking", "thinking": long_thinking}]},
-            },
-        ]
-        segments = build_segments(records)
-        block = segments[0].turns[0].blocks[0]
-        assert block.type == BlockType.THINKING
-        assert block.is_truncated is True
-        assert len(block.content) == 503  # 500 + "..."
-        assert block.full_content == long_thinking
-
-    def test_thinking_not_truncated_under_500(self) -> None:
-        """Thinking under 500 chars is not truncated."""
-        short_thinking = "x" * 400
-        records = [
-            {
-                "uuid": "1",
-                "type": "user",
-                "timestamp": "2026-01-17T10:00:00Z",
-                "message": {"content": [{"type": "text", "text": "hello"}]},
-            },
-            {
-                "uuid": "2",
-                "type": "assistant",
-                "parentUuid": "1",
-                "timestamp": "2026-01-17T10:00:05Z",
-                "message": {"content": [{"type": "thinking", "thinking": short_thinking}]},
-            },
-        ]
-        segments = build_segments(records)
-        block = segments[0].turns[0].blocks[0]
-        assert block.type == BlockType.THINKING
-        assert block.is_truncated is False
-        assert block.content == short_thinking
-        assert block.full_content is None
-
-    def test_tool_input_truncated_at_200(self) -> None:
-        """Tool input truncates at 200 chars."""
-        long_command = "echo " + "x" * 250
-        records = [
-            {
-                "uuid": "1",
-                "type": "user",
-                "timestamp": "2026-01-17T10:00:00Z",
-                "message": {"content": [{"type": "text", "text": "run a command"}]},
-            },
-            {
-                "uuid": "2",
-                "type": "assistant",
-                "parentUuid": "1",
-                "timestamp": "2026-01-17T10:00:05Z",
-                "message": {
-                    "content": [
-                        {
-                            "type": "tool_use",
-                            "id": "tool1",
-                            "name": "Bash",
-                            "input": {"command": long_command},
-                        }
-                    ]
-                },
-            },
-        ]
-        segments = build_segments(records)
-        block = segments[0].turns[0].blocks[0]
-        assert block.type == BlockType.TOOL_USE
-        assert block.is_truncated is True
-        assert len(block.tool_input) == 203  # 200 + "..."
-        assert block.full_content == long_command
-
-    def test_tool_result_truncated_at_300(self) -> None:
-        """Tool result truncates at 300 chars."""
-        long_result = "output: " + "y" * 350
-        records = [
-            {
-                "uuid": "1",
-                "type": "user",
-                "timestamp": "2026-01-17T10:00:00Z",
-                "message": {"content": [{"type": "text", "text": "hello"}]},
-            },
-            {
-                "uuid": "2",
-                "type": "assistant",
-                "parentUuid": "1",
-                "timestamp": "2026-01-17T10:00:05Z",
-                "message": {
-                    "content": [{"type": "tool_use", "id": "tool1", "name": "Bash", "input": {}}]
-                },
-            },
-            {
-                "uuid": "3",
-                "type": "user",
-                "parentUuid": "2",
-                "timestamp": "2026-01-17T10:00:10Z",
-                "message": {
-                    "content": [
-                        {"type": "tool_result", "tool_use_id": "tool1", "content": long_result}
-                    ]
-                },
-            },
-        ]
-        segments = build_segments(records)
-        result_blocks = [b for b in segments[0].turns[0].blocks if b.type == BlockType.TOOL_RESULT]
-        assert len(result_blocks) == 1
-        block = result_blocks[0]
-        assert block.is_truncated is True
-        assert len(block.content) == 303  # 300 + "..."
-        assert block.full_content == long_result
+    @pytest.mark.parametrize(
+        ("block_type", "text", "limit", "is_truncated"),
+        [
+            pytest.param(BlockType.THINKING, "x" * 600, 500, True, id="thinking_truncated"),
+            pytest.param(BlockType.THINKING, "x" * 400, 500, False, id="thinking_under_limit"),
+            # Just over the limit is still truncated, so the preview (limit
+            # plus "...") comes out longer than the original text
+            pytest.param(BlockType.THINKING, "x" * 501, 500, True, id="one_over_limit"),
+            pytest.param(BlockType.THINKING, "x" * 503, 500, True, id="three_over_limit"),
+            pytest.param(BlockType.TOOL_USE, "echo " + "x" * 250, 200, True, id="tool_input"),
+            pytest.param(
+                BlockType.TOOL_RESULT, "output: " + "y" * 350, 300, True, id="tool_result"
+            ),
+        ],
+    )
+    def test_truncation(
+        self, block_type: BlockType, text: str, limit: int, is_truncated: bool
+    ) -> None:
+        """Blocks over their type's limit keep a preview plus the full text."""
+        segments = build_segments(_response_records(block_type, text))
+        matching = [b for b in segments[0].turns[0].blocks if b.type == block_type]
+        assert len(matching) == 1
+        block = matching[0]
+        # The tool_use preview lives in tool_input; other types preview in content
+        preview = block.tool_input if block_type == BlockType.TOOL_USE else block.content
+        expected_preview = text[:limit] + "..." if is_truncated else text
+
+        assert block.is_truncated is is_truncated
+        assert preview == expected_preview
+        assert block.full_content == (text if is_truncated else None)
 
 
 class TestPartitionBySubagent:
@@ -619,3 +761,50 @@ class TestInlineSubagents:
         assert len(tool_blocks) == 4
         tool_names = [b.tool_name for b in tool_blocks]
         assert tool_names == ["Bash", "Read", "Glob", "Grep"]
+
+    def test_only_jsonl_files_loaded(self, tmp_path: Path) -> None:
+        """Non-JSONL files and directories in subagents/ are ignored."""
+        main_jsonl = tmp_path / "session.jsonl"
+        main_jsonl.write_text(
+            '{"uuid": "1", "type": "user", "timestamp": "2026-01-17T10:00:00Z", '
+            '"message": {"content": [{"type": "text", "text": "Hi"}]}}\n'
+        )
+
+        session_dir = tmp_path / "session" / "subagents"
+        session_dir.mkdir(parents=True)
+        (session_dir / "agent-real.jsonl").write_text(
+            '{"uuid": "e1", "type": "assistant", "timestamp": "2026-01-17T10:00:01Z", '
+            '"message": {"content": [{"type": "text", "text": "Done"}]}}\n'
+        )
+        (session_dir / "notes.txt").write_text("not a transcript")
+        (session_dir / "agent-dir.jsonl").mkdir()
+
+        session = parse_session(main_jsonl)
+
+        assert list(session.subagents) == ["real"]
+
+    def test_many_subagent_files_loaded_in_parallel(self, tmp_path: Path) -> None:
+        """Sessions with several subagent files load every one of them."""
+        main_jsonl = tmp_path / "session.jsonl"
+        main_jsonl.write_text(
+            '{"uuid": "1", "type": "user", "timestamp": "2026-01-17T10:00:00Z", '
+            '"message": {"content": [{"type": "text", "text": "Hi"}]}}\n'
+        )
+
+        session_dir = tmp_path / "session" / "subagents"
+        session_dir.mkdir(parents=True)
+        agent_ids = ["a1", "b2", "c3", "d4"]
+        for agent_id in agent_ids:
+            (session_dir / f"agent-{agent_id}.jsonl").write_text(
+                '{"uuid": "e1", "type": "assistant", "timestamp": "2026-01-17T10:00:01Z", '
+                '"message": {"content": [{"type": "tool_use", "id": "t1", '
+                f'"name": "Tool{agent_id}", "input": {{}}}}]}}}}\n'
+            )
+
+        session = parse_session(main_jsonl)
+
+        assert sorted(session.subagents) == agent_ids
+        for agent_id in agent_ids:
+            block = session.subagents[agent_id][0].blocks[0]
+            assert block.type == BlockType.TOOL_USE
+            assert block.tool_name == f"Tool{agent_id}"
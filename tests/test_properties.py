@@ -1,14 +1,44 @@
 """Property-based tests using Hypothesis."""
 
 import json
-import tempfile
-from pathlib import Path
+from collections.abc import Iterator
 
-from hypothesis import given, settings
+from hypothesis import given
 from hypothesis import strategies as st
 
-from cc_flow.models import BlockType
-from cc_flow.parser import build_segments, load_records, truncate
+from cc_flow.models import Block, BlockType, Segment
+from cc_flow.parser import _decode_lines, build_segments, truncate
+
+# Record types load_records drops
+_FILTERED_TYPES = frozenset({"file-history-snapshot", "progress"})
+
+# One JSONL line per filtered type, appended to every filtering example
+_FILTERED_JSONL = b"".join(
+    json.dumps({"type": rec_type, "uuid": f"filtered-{rec_type}"}).encode() + b"\n"
+    for rec_type in sorted(_FILTERED_TYPES)
+)
+
+# 8-character hex ids for uuids and tool_use ids
+_HEX8 = st.text(alphabet="abcdef0123456789", min_size=8, max_size=8)
+
+# Truncation is by length only, so block text sticks to printable ASCII;
+# the truncate properties and TestJsonForHtml keep full Unicode coverage
+_ASCII = st.characters(min_codepoint=32, max_codepoint=126)
+
+
+def _text_around(threshold: int) -> st.SearchStrategy[str]:
+    """Text on either side of a truncation threshold, never far past it."""
+    return st.one_of(
+        st.text(min_size=1, max_size=threshold, alphabet=_ASCII),
+        st.text(min_size=threshold + 1, max_size=threshold + 20, alphabet=_ASCII),
+    )
+
+
+def _iter_blocks(segments: list[Segment]) -> Iterator[Block]:
+    """Yield every block of every turn in segments."""
+    for seg in segments:
+        for turn in seg.turns:
+            yield from turn.blocks
 
 
 # Custom strategies
@@ -16,32 +46,18 @@ from cc_flow.parser import build_segments, load_records, truncate
 def user_record(draw: st.DrawFn) -> dict:
     """Generate a user record."""
     return {
-        "uuid": draw(st.text(alphabet="abcdef0123456789", min_size=8, max_size=8)),
+        "uuid": draw(_HEX8),
         "type": "user",
         "timestamp": "2026-01-17T10:00:00Z",
         "message": {"content": [{"type": "text", "text": draw(st.text(min_size=1, max_size=100))}]},
     }
 
 
-@st.composite
-def assistant_record(draw: st.DrawFn, parent_uuid: str) -> dict:
-    """Generate an assistant record."""
-    return {
-        "uuid": draw(st.text(alphabet="abcdef0123456789", min_size=8, max_size=8)),
-        "type": "assistant",
-        "parentUuid": parent_uuid,
-        "timestamp": "2026-01-17T10:00:05Z",
-        "message": {"content": [{"type": "text", "text": draw(st.text(min_size=1, max_size=100))}]},
-    }
-
-
 @st.composite
 def thinking_block(draw: st.DrawFn) -> dict:
     """Generate a thinking block with variable length content."""
     # Generate content that may or may not exceed truncation threshold (500)
-    content = draw(
-        st.text(min_size=1, max_size=700, alphabet=st.characters(blacklist_categories=("Cs",)))
-    )
+    content = draw(_text_around(500))
     return {"type": "thinking", "thinking": content}
 
 
@@ -49,10 +65,8 @@ def thinking_block(draw: st.DrawFn) -> dict:
 def tool_use_block(draw: st.DrawFn) -> dict:
     """Generate a tool_use block with variable length input."""
     # Generate input that may or may not exceed truncation threshold (200)
-    command = draw(
-        st.text(min_size=1, max_size=350, alphabet=st.characters(blacklist_categories=("Cs",)))
-    )
-    tool_id = draw(st.text(alphabet="abcdef0123456789", min_size=8, max_size=8))
+    command = draw(_text_around(200))
+    tool_id = draw(_HEX8)
     return {
         "type": "tool_use",
         "id": tool_id,
@@ -63,27 +77,32 @@ def tool_use_block(draw: st.DrawFn) -> dict:
 
 @st.composite
 def assistant_with_blocks(draw: st.DrawFn, parent_uuid: str) -> dict:
-    """Generate an assistant record with various block types."""
+    """Generate an assistant record with various block types.
+
+    The id of its tool_use block, if any, is stashed under "_tool_use_id".
+    """
     blocks = []
+    tool_use_id = None
 
     # Randomly include different block types
     if draw(st.booleans()):
         blocks.append(draw(thinking_block()))
     if draw(st.booleans()):
-        blocks.append(draw(tool_use_block()))
+        tool_use = draw(tool_use_block())
+        tool_use_id = tool_use["id"]
+        blocks.append(tool_use)
     # Always include at least one text block if no other blocks
     if not blocks or draw(st.booleans()):
-        text = draw(
-            st.text(min_size=1, max_size=100, alphabet=st.characters(blacklist_categories=("Cs",)))
-        )
+        text = draw(st.text(min_size=1, max_size=100, alphabet=_ASCII))
         blocks.append({"type": "text", "text": text})
 
     return {
-        "uuid": draw(st.text(alphabet="abcdef0123456789", min_size=8, max_size=8)),
+        "uuid": draw(_HEX8),
         "type": "assistant",
         "parentUuid": parent_uuid,
         "timestamp": "2026-01-17T10:00:05Z",
         "message": {"content": blocks},
+        "_tool_use_id": tool_use_id,
     }
 
 
@@ -91,11 +110,9 @@ def assistant_with_blocks(draw: st.DrawFn, parent_uuid: str) -> dict:
 def tool_result_record(draw: st.DrawFn, parent_uuid: str, tool_use_id: str) -> dict:
     """Generate a tool_result record with variable length content."""
     # Generate content that may or may not exceed truncation threshold (300)
-    content = draw(
-        st.text(min_size=1, max_size=450, alphabet=st.characters(blacklist_categories=("Cs",)))
-    )
+    content = draw(_text_around(300))
     return {
-        "uuid": draw(st.text(alphabet="abcdef0123456789", min_size=8, max_size=8)),
+        "uuid": draw(_HEX8),
         "type": "user",
         "parentUuid": parent_uuid,
         "timestamp": "2026-01-17T10:00:10Z",
@@ -120,10 +137,9 @@ def conversation_with_blocks(draw: st.DrawFn) -> list[dict]:
     records = [user, assistant]
 
     # If assistant has tool_use, potentially add tool_result
-    for block in assistant["message"]["content"]:
-        if block.get("type") == "tool_use" and draw(st.booleans()):
-            tool_result = draw(tool_result_record(assistant["uuid"], block["id"]))
-            records.append(tool_result)
+    tool_use_id = assistant.pop("_tool_use_id")
+    if tool_use_id and draw(st.booleans()):
+        records.append(draw(tool_result_record(assistant["uuid"], tool_use_id)))
 
     return records
 
@@ -131,7 +147,8 @@ def conversation_with_blocks(draw: st.DrawFn) -> list[dict]:
 class TestTruncateProperties:
     """Property-based tests for truncate function."""
 
-    @given(st.text(), st.integers(min_value=1, max_value=1000))
+    # Just past the largest max_len, so both branches are reachable
+    @given(st.text(max_size=1100), st.integers(min_value=1, max_value=1000))
     def test_output_never_exceeds_limit_plus_ellipsis(self, text: str, max_len: int) -> None:
         """Output length never exceeds max_len + 3 (for ellipsis)."""
         result = truncate(text, max_len)
@@ -148,7 +165,6 @@ class TestBuildSegmentsProperties:
     """Property-based tests for build_segments function."""
 
     @given(st.lists(user_record(), min_size=0, max_size=5))
-    @settings(max_examples=20)
     def test_no_data_loss(self, user_records: list[dict]) -> None:
         """Every user record appears in output segments."""
         if not user_records:
@@ -168,43 +184,36 @@ class TestBuildSegmentsProperties:
 
 
 class TestLoadRecordsProperties:
-    """Property-based tests for load_records function."""
+    """Property-based tests for load_records decoding and filtering."""
 
     @given(
         st.lists(
             st.fixed_dictionaries(
                 {
                     "type": st.sampled_from(["user", "assistant", "system"]),
-                    "uuid": st.text(alphabet="abcdef0123456789", min_size=8, max_size=8),
+                    "uuid": _HEX8,
                 }
             ),
             min_size=0,
             max_size=10,
         )
     )
-    @settings(max_examples=20)
     def test_filters_correctly(self, input_records: list[dict]) -> None:
         """Filtered record types are never in output."""
-        # Add some records that should be filtered
-        all_records = input_records + [
-            {"type": "file-history-snapshot", "uuid": "filtered1"},
-            {"type": "progress", "uuid": "filtered2"},
-        ]
-
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".jsonl", delete=False) as f:
-            f.write("\n".join(json.dumps(r) for r in all_records))
-            f.flush()
-            result = load_records(Path(f.name))
+        # Decode from memory; TestLoadRecords covers reading the file itself
+        lines = "".join(json.dumps(r) + "\n" for r in input_records).encode()
+        buf = lines + _FILTERED_JSONL
+        result = list(_decode_lines(buf))
 
         for rec in result:
-            assert rec.get("type") not in ["file-history-snapshot", "progress"]
+            assert rec.get("type") not in _FILTERED_TYPES
+        assert result == input_records
 
 
 class TestTruncationConsistency:
     """Property tests for truncation flag consistency."""
 
     @given(conversation_with_blocks())
-    @settings(max_examples=50)
     def test_truncation_flag_matches_full_content(self, records: list[dict]) -> None:
         """is_truncated=True ↔ full_content is not None, always.
 
@@ -212,34 +221,33 @@ class TestTruncationConsistency:
         If is_truncated is True but full_content is None, the button does nothing.
         If is_truncated is False but full_content is set, memory is wasted.
         """
-        segments = build_segments(records)
-
-        for seg in segments:
-            for turn in seg.turns:
-                for block in turn.blocks:
-                    if block.is_truncated:
-                        assert block.full_content is not None, (
-                            f"Block {block.type} has is_truncated=True but full_content=None. "
-                            f"Content length: {len(block.content)}"
-                        )
-                    else:
-                        assert block.full_content is None, (
-                            f"Block {block.type} has is_truncated=False but full_content is set. "
-                            f"Content: {block.content[:50]}..."
-                        )
+        for block in _iter_blocks(build_segments(records)):
+            if block.is_truncated:
+                assert block.full_content is not None, (
+                    f"Block {block.type} has is_truncated=True but full_content=None. "
+                    f"Content length: {len(block.content)}"
+                )
+            else:
+                assert block.full_content is None, (
+                    f"Block {block.type} has is_truncated=False but full_content is set. "
+                    f"Content: {block.content[:50]}..."
+                )
 
     @given(conversation_with_blocks())
-    @settings(max_examples=50)
-    def test_truncated_content_shorter_than_full(self, records: list[dict]) -> None:
-        """When truncated, displayed content should be shorter than full content."""
-        segments = build_segments(records)
-
-        for seg in segments:
-            for turn in seg.turns:
-                for block in turn.blocks:
-                    if block.is_truncated and block.full_content:
-                        # For tool_use, truncated content is in tool_input
-                        if block.type == BlockType.TOOL_USE:
-                            assert len(block.tool_input) < len(block.full_content)
-                        else:
-                            assert len(block.content) < len(block.full_content)
+    def test_truncated_preview_is_prefix_plus_ellipsis(self, records: list[dict]) -> None:
+        """When truncated, the preview is a strictly shorter prefix of full_content plus "...".
+
+        The preview as a whole is not always shorter: text 1-3 characters over
+        the limit gets a preview longer than the original (pinned in
+        TestBlockTruncation).
+        """
+        for block in _iter_blocks(build_segments(records)):
+            full_content = block.full_content
+            if block.is_truncated and full_content:
+                # For tool_use, truncated content is in tool_input
+                is_tool_use = block.type == BlockType.TOOL_USE
+                preview = block.tool_input if is_tool_use else block.content
+                kept = preview.removesuffix("...")
+                assert preview.endswith("...")
+                assert full_content.startswith(kept)
+                assert len(kept) < len(full_content)
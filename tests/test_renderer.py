@@ -3,6 +3,12 @@
 import json
 from pathlib import Path
 
+import pytest
+from jinja2 import Environment, PackageLoader
+from jinja2.bccache import bc_magic
+
+from cc_flow import renderer
+from cc_flow.models import Segment, Session, Turn
 from cc_flow.parser import parse_session
 from cc_flow.renderer import (
     compute_metadata,
@@ -12,9 +18,21 @@ from cc_flow.renderer import (
     process_images,
     render,
     render_json,
+    render_to_file,
     session_to_dict,
 )
 
+# Minimal valid PNG (1x1 transparent pixel): signature, IHDR, IDAT, IEND
+_MIN_PNG = bytes.fromhex(
+    "89504e470d0a1a0a"
+    "0000000d49484452000000010000000108060000001f15c489"
+    "0000000a49444154789c63000100000500010d0a2db4"
+    "0000000049454e44ae426082"
+)
+
+# Minimal JPEG header
+_MIN_JPEG = bytes([0xFF, 0xD8, 0xFF, 0xE0]) + b"JFIF" + b"\x00" * 100
+
 
 class TestJsonForHtml:
     """Tests for json_for_html function."""
@@ -22,19 +40,26 @@ class TestJsonForHtml:
     def test_simple_dict(self) -> None:
         """Simple dict is serialized correctly."""
         result = json_for_html({"key": "value"})
-        assert result == '{"key": "value"}'
+        assert result == '{"key":"value"}'
 
     def test_escapes_script_tag(self) -> None:
         """Script tags are escaped."""
         result = json_for_html({"text": "</script>"})
         assert "</script>" not in result
-        assert "scr\\u0069pt" in result
+        assert "\\u003c/script>" in result
 
     def test_escapes_html_comment(self) -> None:
         """HTML comments are escaped."""
         result = json_for_html({"text": "<!--comment-->"})
         assert "<!--" not in result
-        assert "<\\u0021--" in result
+        assert "\\u003c!--" in result
+
+    def test_escapes_round_trip(self) -> None:
+        """Escaped output decodes back to the original text."""
+        text = "a < b </script><!-- </SCRIPT>"
+        result = json_for_html({"text": text})
+        assert "<" not in result
+        assert json.loads(result) == {"text": text}
 
     def test_unicode(self) -> None:
         """Unicode is preserved."""
@@ -45,174 +70,160 @@ class TestJsonForHtml:
 class TestSessionToDict:
     """Tests for session_to_dict function."""
 
-    def test_simple_session(self, simple_session: Path) -> None:
+    def test_simple_session(self, simple_session_parsed: Session) -> None:
         """Simple session is converted correctly."""
-        session = parse_session(simple_session)
-        data = session_to_dict(session)
+        data = session_to_dict(simple_session_parsed)
         assert "segments" in data
         assert "subagents" in data
         assert len(data["segments"]) == 1
         assert len(data["segments"][0]["turns"]) == 2
 
-    def test_session_with_compaction(self, with_compaction_session: Path) -> None:
+    def test_session_with_compaction(self, with_compaction_session_parsed: Session) -> None:
         """Session with compaction includes metadata."""
-        session = parse_session(with_compaction_session)
-        data = session_to_dict(session)
+        data = session_to_dict(with_compaction_session_parsed)
         continuation = data["segments"][1]
         assert continuation["compact_metadata"] is not None
         assert continuation["compact_metadata"]["pre_tokens"] == 162000
 
+    def test_embedded_images_encoded_once_per_render(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        """A shared image is encoded once per render and re-read on the next one."""
+        img = tmp_path / "shot.png"
+        img.write_bytes(b"first")
+        turns = [
+            Turn(id=i, user_message="look", user_timestamp="", image_paths=[str(img)])
+            for i in range(2)
+        ]
+        session = Session(
+            segments=[Segment(id=0, type="original", timestamp="", turns=turns)],
+            subagents={},
+        )
+        calls: list[str] = []
+
+        def counting(path: str) -> str | None:
+            calls.append(path)
+            return image_to_data_url(path)
+
+        monkeypatch.setattr(renderer, "image_to_data_url", counting)
+
+        first = session_to_dict(session, embed_images=True)
+        assert calls == [str(img)]
+        first_urls = [t["images"][0]["data_url"] for t in first["segments"][0]["turns"]]
+        assert first_urls[0] == first_urls[1]
+
+        # A later render picks up changes to the file
+        img.write_bytes(b"second")
+        second = session_to_dict(session, embed_images=True)
+        assert len(calls) == 2
+        assert second["segments"][0]["turns"][0]["images"][0]["data_url"] != first_urls[0]
+
 
 class TestRender:
     """Tests for render function."""
 
-    def test_renders_html(self, simple_session: Path) -> None:
+    def test_renders_html(self, simple_rendered_html: str) -> None:
         """Render produces valid HTML."""
-        session = parse_session(simple_session)
-        html = render(session)
+        html = simple_rendered_html
         assert "<!DOCTYPE html>" in html
         assert "<html" in html
         assert "</html>" in html
 
-    def test_includes_session_data(self, simple_session: Path) -> None:
+    def test_includes_session_data(self, simple_rendered_html: str) -> None:
         """Rendered HTML includes session data."""
-        session = parse_session(simple_session)
-        html = render(session)
+        html = simple_rendered_html
         assert "const data =" in html
         assert '"segments"' in html
 
-    def test_includes_styles(self, simple_session: Path) -> None:
+    def test_session_data_in_json_script_tag(
+        self, simple_session_parsed: Session, simple_rendered_html: str
+    ) -> None:
+        """Session data is embedded as a parseable application/json script."""
+        html = simple_rendered_html
+        start_tag = '<script type="application/json" id="session-data">'
+        assert start_tag in html
+        payload = html.split(start_tag, 1)[1].split("</script>", 1)[0]
+        assert json.loads(payload) == session_to_dict(simple_session_parsed)
+
+    def test_includes_styles(self, simple_rendered_html: str) -> None:
         """Rendered HTML includes CSS styles."""
-        session = parse_session(simple_session)
-        html = render(session)
+        html = simple_rendered_html
         assert "<style>" in html
         assert "--coral:" in html  # Anthropic color palette
 
-    def test_includes_scripts(self, simple_session: Path) -> None:
+    def test_includes_scripts(self, simple_rendered_html: str) -> None:
         """Rendered HTML includes JavaScript."""
-        session = parse_session(simple_session)
-        html = render(session)
+        html = simple_rendered_html
         assert "<script" in html
         assert "function render()" in html
 
     def test_empty_session(self) -> None:
         """Empty session renders without error."""
-        from cc_flow.models import Session
-
         session = Session(segments=[], subagents={})
         html = render(session)
         assert "<!DOCTYPE html>" in html
 
+    def test_render_to_file_matches_render(
+        self, simple_session_parsed: Session, simple_rendered_html: str, tmp_path: Path
+    ) -> None:
+        """Streaming to a file writes the same HTML as render()."""
+        output = tmp_path / "out.html"
+        render_to_file(simple_session_parsed, output)
+        assert output.read_text(encoding="utf-8") == simple_rendered_html
 
-class TestImageToDataUrl:
-    """Tests for image_to_data_url function."""
 
-    def test_valid_png(self, tmp_path: Path) -> None:
-        """Valid PNG file returns data URL with correct MIME type."""
-        # Minimal valid PNG (1x1 transparent pixel)
-        png_data = bytes(
-            [
-                0x89,
-                0x50,
-                0x4E,
-                0x47,
-                0x0D,
-                0x0A,
-                0x1A,
-                0x0A,  # PNG signature
-                0x00,
-                0x00,
-                0x00,
-                0x0D,
-                0x49,
-                0x48,
-                0x44,
-                0x52,  # IHDR chunk
-                0x00,
-                0x00,
-                0x00,
-                0x01,
-                0x00,
-                0x00,
-                0x00,
-                0x01,
-                0x08,
-                0x06,
-                0x00,
-                0x00,
-                0x00,
-                0x1F,
-                0x15,
-                0xC4,
-                0x89,
-                0x00,
-                0x00,
-                0x00,
-                0x0A,
-                0x49,
-                0x44,
-                0x41,
-                0x54,
-                0x78,
-                0x9C,
-                0x63,
-                0x00,
-                0x01,
-                0x00,
-                0x00,
-                0x05,
-                0x00,
-                0x01,
-                0x0D,
-                0x0A,
-                0x2D,
-                0xB4,
-                0x00,
-                0x00,
-                0x00,
-                0x00,
-                0x49,
-                0x45,
-                0x4E,
-                0x44,
-                0xAE,
-                0x42,
-                0x60,
-                0x82,
-            ]
-        )
-        img = tmp_path / "test.png"
-        img.write_bytes(png_data)
+class TestBytecodeCache:
+    """Tests for the best-effort template bytecode cache."""
 
-        result = image_to_data_url(str(img))
-        assert result is not None
-        assert result.startswith("data:image/png;base64,")
+    def _load_template(self, cache_dir: Path) -> str:
+        cache = renderer._BestEffortBytecodeCache(directory=str(cache_dir))
+        env = Environment(loader=PackageLoader("cc_flow", "templates"), bytecode_cache=cache)
+        return env.get_template("base.html.j2").render(session_json="{}")
+
+    def test_missing_cache_dir_still_renders(self, tmp_path: Path) -> None:
+        """A cache directory deleted from under the cache falls back to compiling."""
+        html = self._load_template(tmp_path / "removed")
+        assert "<!DOCTYPE html>" in html
+
+    def test_corrupt_cache_entry_still_renders(self, tmp_path: Path) -> None:
+        """A cache file cut off after its header is treated as a miss."""
+        self._load_template(tmp_path)
+        (entry,) = tmp_path.iterdir()
+        entry.write_bytes(bc_magic + b"\x80")
+        html = self._load_template(tmp_path)
+        assert "<!DOCTYPE html>" in html
 
-    def test_valid_jpeg(self, tmp_path: Path) -> None:
-        """Valid JPEG file returns data URL with correct MIME type."""
-        # Minimal JPEG header
-        jpeg_data = bytes([0xFF, 0xD8, 0xFF, 0xE0]) + b"JFIF" + b"\x00" * 100
-        img = tmp_path / "test.jpg"
-        img.write_bytes(jpeg_data)
+
+class TestImageToDataUrl:
+    """Tests for image_to_data_url function."""
+
+    @pytest.mark.parametrize(
+        ("filename", "data", "prefix"),
+        [
+            pytest.param("test.png", _MIN_PNG, "data:image/png;base64,", id="png"),
+            pytest.param("test.jpg", _MIN_JPEG, "data:image/jpeg;base64,", id="jpeg"),
+            pytest.param(
+                "test.unknownext12345",
+                b"some data",
+                "data:image/png;base64,",
+                id="unknown_extension_defaults_to_png",
+            ),
+        ],
+    )
+    def test_mime_type(self, tmp_path: Path, filename: str, data: bytes, prefix: str) -> None:
+        """The data URL carries the MIME type guessed from the file extension."""
+        img = tmp_path / filename
+        img.write_bytes(data)
 
         result = image_to_data_url(str(img))
         assert result is not None
-        assert result.startswith("data:image/jpeg;base64,")
+        assert result.startswith(prefix)
 
     def test_missing_file_returns_none(self) -> None:
         """Non-existent file returns None."""
         result = image_to_data_url("/nonexistent/path/to/image.png")
         assert result is None
 
-    def test_unknown_extension_defaults_to_png(self, tmp_path: Path) -> None:
-        """Unknown extension defaults to image/png MIME type."""
-        img = tmp_path / "test.unknownext12345"
-        img.write_bytes(b"some data")
-
-        result = image_to_data_url(str(img))
-        assert result is not None
-        assert result.startswith("data:image/png;base64,")
-
     def test_base64_encoding(self, tmp_path: Path) -> None:
         """Content is correctly base64 encoded."""
         import base64
@@ -271,10 +282,9 @@ class TestProcessImages:
 class TestComputeMetadata:
     """Tests for compute_metadata function."""
 
-    def test_simple_session(self, simple_session: Path) -> None:
+    def test_simple_session(self, simple_session: Path, simple_session_parsed: Session) -> None:
         """Metadata is computed correctly for simple session."""
-        session = parse_session(simple_session)
-        metadata = compute_metadata(session, simple_session)
+        metadata = compute_metadata(simple_session_parsed, simple_session)
 
         assert metadata["session_id"] == "simple"
         assert metadata["total_turns"] == 2
@@ -282,18 +292,17 @@ class TestComputeMetadata:
         assert metadata["compactions"] == 0
         assert metadata["started"] == "2026-01-17T10:00:00Z"
 
-    def test_session_with_compaction(self, with_compaction_session: Path) -> None:
+    def test_session_with_compaction(
+        self, with_compaction_session: Path, with_compaction_session_parsed: Session
+    ) -> None:
         """Compaction count is correct."""
-        session = parse_session(with_compaction_session)
-        metadata = compute_metadata(session, with_compaction_session)
+        metadata = compute_metadata(with_compaction_session_parsed, with_compaction_session)
 
         assert metadata["compactions"] == 1
         assert metadata["total_turns"] == 2
 
     def test_empty_session(self, tmp_path: Path) -> None:
         """Empty session has null started timestamp."""
-        from cc_flow.models import Session
-
         session = Session(segments=[], subagents={})
         fake_path = tmp_path / "empty.jsonl"
         metadata = compute_metadata(session, fake_path)
@@ -306,63 +315,53 @@ class TestComputeMetadata:
 class TestRenderJson:
     """Tests for render_json function."""
 
-    def test_output_is_valid_json(self, simple_session: Path) -> None:
+    def test_output_is_valid_json(self, simple_rendered_json: str) -> None:
         """Output parses as valid JSON."""
-        session = parse_session(simple_session)
-        result = render_json(session, simple_session)
-
-        data = json.loads(result)
+        data = json.loads(simple_rendered_json)
         assert "metadata" in data
         assert "segments" in data
         assert "subagents" in data
 
-    def test_metadata_first_in_output(self, simple_session: Path) -> None:
+    def test_metadata_first_in_output(self, simple_rendered_json: str) -> None:
         """Metadata key appears first in output."""
-        session = parse_session(simple_session)
-        result = render_json(session, simple_session)
-
         # First key should be "metadata"
-        assert result.strip().startswith('{\n  "metadata"')
+        assert simple_rendered_json.strip().startswith('{\n  "metadata"')
 
-    def test_compact_mode(self, simple_session: Path) -> None:
+    def test_compact_mode(self, simple_session: Path, simple_session_parsed: Session) -> None:
         """Compact mode produces single-line output."""
-        session = parse_session(simple_session)
-        result = render_json(session, simple_session, compact=True)
+        result = render_json(simple_session_parsed, simple_session, compact=True)
 
         # Compact JSON has no newlines (except within string values)
         lines = result.strip().split("\n")
         assert len(lines) == 1
 
-    def test_pretty_mode_has_indentation(self, simple_session: Path) -> None:
-        """Pretty mode produces indented output."""
-        session = parse_session(simple_session)
-        result = render_json(session, simple_session, compact=False)
-
+    def test_pretty_mode_has_indentation(self, simple_rendered_json: str) -> None:
+        """Pretty mode (the default) produces indented output."""
         # Pretty JSON has multiple lines with indentation
-        assert "\n  " in result
+        assert "\n  " in simple_rendered_json
 
 
 class TestDictToSession:
     """Tests for dict_to_session function."""
 
-    def test_round_trip_simple(self, simple_session: Path) -> None:
+    def test_round_trip_simple(self, simple_session_parsed: Session) -> None:
         """JSONL -> Session -> dict -> Session produces equivalent result."""
-        original = parse_session(simple_session)
-        data = session_to_dict(original)
+        data = session_to_dict(simple_session_parsed)
         restored = dict_to_session(data)
 
-        assert len(restored.segments) == len(original.segments)
-        assert len(restored.subagents) == len(original.subagents)
+        assert len(restored.segments) == len(simple_session_parsed.segments)
+        assert len(restored.subagents) == len(simple_session_parsed.subagents)
 
-        for orig_seg, rest_seg in zip(original.segments, restored.segments, strict=True):
+        for orig_seg, rest_seg in zip(
+            simple_session_parsed.segments, restored.segments, strict=True
+        ):
             assert rest_seg.id == orig_seg.id
             assert rest_seg.type == orig_seg.type
             assert len(rest_seg.turns) == len(orig_seg.turns)
 
-    def test_round_trip_with_compaction(self, with_compaction_session: Path) -> None:
+    def test_round_trip_with_compaction(self, with_compaction_session_parsed: Session) -> None:
         """Compaction metadata survives round-trip."""
-        original = parse_session(with_compaction_session)
-        data = session_to_dict(original)
+        data = session_to_dict(with_compaction_session_parsed)
         restored = dict_to_session(data)
 
         assert restored.segments[1].compact_metadata is not None